@@ -0,0 +1,254 @@
+"""
+Accuracy and cost reports for the physics options.
+
+Usage:
+    python benchmark.py barnes_hut [--ships 500 2000 5000] [--thetas 0.3 0.5 0.7 1.0]
+    python benchmark.py grid [--ships 500 2000 5000] [--cutoffs 0.5 1.0 2.0]
+    python benchmark.py integrators [--dts 0.01 0.05] [--orbits 100]
+    python benchmark.py physics [--ships 1 100 10000] [--steps 2000]
+    python benchmark.py static_field [--bodies 1 4 16 64] [--ships 1000]
+"""
+import argparse
+import time
+import numpy as np
+from gravity import DirectSum, BarnesHutTree, NeighborGrid
+from integrators import INTEGRATORS, FORCE_EVALUATIONS
+from environment import OrbitalEnvironment
+from static_field import StaticGravityField
+import physics
+
+
+def random_ship_positions(n, rng, r_min=0.2, r_max=4.0):
+    """Ships spread uniformly (by area) over the annulus where add_ship places them"""
+    r = np.sqrt(rng.uniform(r_min**2, r_max**2, n))
+    angle = rng.uniform(0.0, 2 * np.pi, n)
+    return r * np.cos(angle), r * np.sin(angle)
+
+
+def _timed(fn, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+######################## BARNES-HUT VERSUS DIRECT SUM ########################
+def barnes_hut_report(ship_counts=(500, 2000, 5000), thetas=(0.3, 0.5, 0.7, 1.0), gm=0.1, seed=0):
+    """
+    Compares the Barnes-Hut ship-to-ship acceleration against the direct sum.
+    Errors are |a_bh - a_direct| per ship, relative to that ship's |a_direct| (median, p99) and to the
+    RMS perturbation over all ships (max). Times include the tree build, as paid once per tick.
+
+    Returns: List of result dicts, one per (ship count, theta).
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    print(f"{'ships':>6} {'theta':>6} {'median rel':>11} {'p99 rel':>9} {'max/rms':>9} "
+          f"{'bh ms':>8} {'direct ms':>10} {'speedup':>8}")
+    for n in ship_counts:
+        x, y = random_ship_positions(n, rng)
+        self_index = np.arange(n)
+        exact, direct_time = _timed(lambda: DirectSum(x, y, gm).acceleration(x, y, self_index))
+        exact_norm = np.linalg.norm(exact, axis=1)
+        rms = np.sqrt(np.mean(exact_norm**2))
+        for theta in thetas:
+            approx, bh_time = _timed(lambda: BarnesHutTree(x, y, gm, theta=theta).acceleration(x, y, self_index))
+            err = np.linalg.norm(approx - exact, axis=1)
+            rel = err / np.maximum(exact_norm, 1e-12)
+            row = {
+                'ships': n, 'theta': theta,
+                'median_rel_err': float(np.median(rel)),
+                'p99_rel_err': float(np.percentile(rel, 99)),
+                'max_err_over_rms': float(err.max() / rms),
+                'bh_ms': bh_time * 1e3, 'direct_ms': direct_time * 1e3,
+            }
+            results.append(row)
+            print(f"{n:>6} {theta:>6.2f} {row['median_rel_err']:>11.2e} {row['p99_rel_err']:>9.2e} "
+                  f"{row['max_err_over_rms']:>9.2e} {row['bh_ms']:>8.1f} {row['direct_ms']:>10.1f} "
+                  f"{direct_time / bh_time:>8.1f}x")
+    return results
+
+
+######################## CUTOFF GRID VERSUS DIRECT SUM ########################
+def grid_report(ship_counts=(500, 2000, 5000), cutoffs=(0.5, 1.0, 2.0), gm=0.1, seed=0):
+    """
+    Compares the cutoff NeighborGrid ship-to-ship acceleration against the direct sum, together with the
+    grid's own per-ship error bound (skipped ships * gm / cutoff^2). Times include re-binning, as paid once per tick.
+
+    Returns: List of result dicts, one per (ship count, cutoff).
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    print(f"{'ships':>6} {'cutoff':>6} {'max err':>9} {'max bound':>9} {'max/rms':>9} "
+          f"{'grid ms':>8} {'direct ms':>10} {'speedup':>8}")
+    for n in ship_counts:
+        x, y = random_ship_positions(n, rng)
+        self_index = np.arange(n)
+        exact, direct_time = _timed(lambda: DirectSum(x, y, gm).acceleration(x, y, self_index))
+        rms = np.sqrt(np.mean(np.sum(exact**2, axis=1)))
+        for cutoff in cutoffs:
+            grid = NeighborGrid(x, y, gm, cutoff=cutoff)
+            approx, grid_time = _timed(lambda: (grid.update(x, y), grid.acceleration(x, y, self_index))[1])
+            err = np.linalg.norm(approx - exact, axis=1)
+            assert np.all(err <= grid.error_bound + 1e-9), "error bound violated"
+            row = {
+                'ships': n, 'cutoff': cutoff,
+                'max_err': float(err.max()), 'max_bound': float(grid.error_bound.max()),
+                'max_err_over_rms': float(err.max() / rms),
+                'grid_ms': grid_time * 1e3, 'direct_ms': direct_time * 1e3,
+            }
+            results.append(row)
+            print(f"{n:>6} {cutoff:>6.2f} {row['max_err']:>9.2e} {row['max_bound']:>9.2e} "
+                  f"{row['max_err_over_rms']:>9.2e} {row['grid_ms']:>8.1f} {row['direct_ms']:>10.1f} "
+                  f"{direct_time / grid_time:>8.1f}x")
+    return results
+
+
+######################## INTEGRATOR COST AND ENERGY DRIFT ########################
+def integrator_report(dts=(0.01, 0.05), orbits=100, r0=1.0, speed_factor=1.2, GM=1.0):
+    """
+    Coasts a single ship in OrbitalEnvironment with every integrator and reports force evaluations per
+    orbit, wall time per orbit and the relative energy drift |E - E0| / |E0| (final and worst).
+    For 'dopri5' the evaluations are the ones actually spent by its adaptive substeps.
+    speed_factor scales the circular speed at r0, so the default orbit has eccentricity ~0.44.
+
+    Returns: List of result dicts, one per (dt, integrator).
+    """
+    v0 = speed_factor * np.sqrt(GM / r0)
+    energy0 = 0.5 * v0**2 - GM / r0
+    period = 2 * np.pi * np.sqrt((-GM / (2 * energy0))**3 / GM)
+    results = []
+    print(f"{'dt':>6} {'integrator':>10} {'evals/orbit':>12} {'ms/orbit':>9} {'final drift':>12} {'max drift':>10}")
+    for dt in dts:
+        steps = int(round(orbits * period / dt))
+        for integrator in INTEGRATORS:
+            env = OrbitalEnvironment(GM=GM, r0=r0, dt=dt, max_steps=steps, integrator=integrator)
+            env.vy = v0
+            no_thrust = np.zeros(1)
+            states = np.empty((steps, 4))
+            start = time.perf_counter()
+            for i in range(steps):
+                env.step(no_thrust)
+                states[i] = env.x, env.y, env.vx, env.vy
+            elapsed = time.perf_counter() - start
+            x, y, vx, vy = states.T
+            energy = 0.5 * (vx**2 + vy**2) - GM / np.sqrt(x**2 + y**2)
+            drift = np.abs(energy - energy0) / abs(energy0)
+            if integrator == 'dopri5':
+                evaluations = env._dopri.evaluations
+            else:
+                evaluations = FORCE_EVALUATIONS[integrator] * steps
+            row = {
+                'dt': dt, 'integrator': integrator,
+                'evals_per_orbit': evaluations / orbits,
+                'ms_per_orbit': elapsed * 1e3 / orbits,
+                'final_drift': float(drift[-1]), 'max_drift': float(drift.max()),
+            }
+            results.append(row)
+            print(f"{dt:>6.3f} {integrator:>10} {row['evals_per_orbit']:>12.0f} {row['ms_per_orbit']:>9.2f} "
+                  f"{row['final_drift']:>12.2e} {row['max_drift']:>10.2e}")
+    return results
+
+
+######################## PHYSICS KERNEL BACKENDS ########################
+def physics_report(ship_counts=(1, 100, 10000), steps=2000, r0=1.5, thrust=0.1, GM=1.0, dt=0.01):
+    """
+    Times one physics kernel step (RK4, tangential thrust, boundary check) with every available backend.
+    For one ship this is step_one() on floats, as OrbitalEnvironment calls it; for more, the batched step().
+    Numba compiles on the first call, which is done before timing.
+
+    Returns: List of result dicts, one per (ship count, backend), with ns per ship-step.
+    """
+    results = []
+    print(f"{'ships':>6} {'backend':>8} {'ns/ship-step':>13}")
+    for n in ship_counts:
+        # Circular orbits, so ships stay in bounds for any number of steps
+        state = np.tile([r0, 0.0, 0.0, np.sqrt(GM / r0)], (n, 1))
+        thrust_n = np.full(n, thrust)
+        reps = max(steps // n, 3)
+        for backend in physics.available_backends():
+            kernel = physics.get_kernel(backend)
+            if n == 1:
+                def run():
+                    x, y, vx, vy = state[0].tolist()
+                    for _ in range(reps):
+                        x, y, vx, vy, _ = kernel.step_one(x, y, vx, vy, thrust, GM, dt)
+            else:
+                def run():
+                    s = state
+                    for _ in range(reps):
+                        s, _ = kernel.step(s, thrust_n, GM, dt)
+            run()  # Warm-up (and JIT compilation)
+            _, elapsed = _timed(run)
+            row = {'ships': n, 'backend': backend, 'ns_per_ship_step': elapsed * 1e9 / (reps * n)}
+            results.append(row)
+            print(f"{n:>6} {backend:>8} {row['ns_per_ship_step']:>13.1f}")
+    return results
+
+
+######################## STATIC BODIES ########################
+def static_field_report(body_counts=(1, 4, 16, 64), ships=1000, gm=0.05, seed=0, steps=200):
+    """
+    Cost of StaticGravityField's direct sum at ships spread over the play area, next to the central star's pull
+    that every physics step computes anyway.
+
+    Returns: List of result dicts, one per body count.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = random_ship_positions(ships, rng)
+
+    def central():
+        dist = np.maximum(np.sqrt(x**2 + y**2), 1e-5)
+        central = -1.0 / dist**3
+        return np.stack([central * x, central * y], axis=1)
+
+    _, central_time = _timed(central, repeats=steps)
+    results = []
+    print(f"{'bodies':>6} {'static ms':>10} {'central ms':>11} {'ratio':>6}")
+    for n in body_counts:
+        bx, by = random_ship_positions(n, rng)
+        field = StaticGravityField([(a, b, gm) for a, b in zip(bx, by)])
+        _, field_time = _timed(lambda: field.acceleration(x, y), repeats=steps)
+        row = {'bodies': n, 'static_ms': field_time * 1e3, 'central_ms': central_time * 1e3}
+        results.append(row)
+        print(f"{n:>6} {row['static_ms']:>10.3f} {row['central_ms']:>11.3f} {field_time / central_time:>6.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="report", required=True)
+
+    bh = subparsers.add_parser("barnes_hut", help="Barnes-Hut accuracy versus direct sum")
+    bh.add_argument("--ships", type=int, nargs="+", default=[500, 2000, 5000])
+    bh.add_argument("--thetas", type=float, nargs="+", default=[0.3, 0.5, 0.7, 1.0])
+
+    grid = subparsers.add_parser("grid", help="Cutoff neighbor grid accuracy versus direct sum")
+    grid.add_argument("--ships", type=int, nargs="+", default=[500, 2000, 5000])
+    grid.add_argument("--cutoffs", type=float, nargs="+", default=[0.5, 1.0, 2.0])
+
+    integ = subparsers.add_parser("integrators", help="Integrator force evaluations and energy drift")
+    integ.add_argument("--dts", type=float, nargs="+", default=[0.01, 0.05])
+    integ.add_argument("--orbits", type=int, default=100)
+
+    phys = subparsers.add_parser("physics", help="Physics kernel ns/step per backend")
+    phys.add_argument("--ships", type=int, nargs="+", default=[1, 100, 10000])
+    phys.add_argument("--steps", type=int, default=2000)
+
+    static = subparsers.add_parser("static_field", help="Static-body sum cost per lookup")
+    static.add_argument("--bodies", type=int, nargs="+", default=[1, 4, 16, 64])
+    static.add_argument("--ships", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.report == "barnes_hut":
+        barnes_hut_report(args.ships, args.thetas)
+    elif args.report == "grid":
+        grid_report(args.ships, args.cutoffs)
+    elif args.report == "integrators":
+        integrator_report(args.dts, args.orbits)
+    elif args.report == "physics":
+        physics_report(args.ships, args.steps)
+    elif args.report == "static_field":
+        static_field_report(args.bodies, args.ships)
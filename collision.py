@@ -0,0 +1,144 @@
+"""
+Continuous (swept) event detection over one integrator step.
+
+Between its start and end states a ship's path is taken as the cubic Hermite curve through both positions with
+both velocities, p(s) for s = t / dt in [0, 1]. The curve is 4th-order accurate in dt and, in Bezier form, lies
+inside the convex hull of its four control points, which gives cheap conservative filters. Only ships (or pairs)
+that pass the filters get an exact solve: |p(s)|^2 - R^2 is a degree-6 polynomial whose first root in [0, 1]
+is the time of impact.
+"""
+import math
+import numpy as np
+
+
+def hermite_coefficients(start, end, dt):
+    """Monomial coefficients [4, N, 2] of the Hermite path p(s) = sum_k c[k] s^k, from states [N, 4]"""
+    p0, v0 = start[:, :2], start[:, 2:] * dt
+    p1, v1 = end[:, :2], end[:, 2:] * dt
+    return np.stack([p0, v0, 3*(p1 - p0) - 2*v0 - v1, 2*(p0 - p1) + v0 + v1])
+
+
+def hermite_state(start, end, dt, s):
+    """Interpolated states [N, 4] at fractions s [N] of the step"""
+    c = hermite_coefficients(start, end, dt)
+    s = s[:, None]
+    pos = c[0] + s * (c[1] + s * (c[2] + s * c[3]))
+    vel = (c[1] + s * (2 * c[2] + s * 3 * c[3])) / dt
+    return np.concatenate([pos, vel], axis=1)
+
+
+def control_points(start, end, dt):
+    """Bezier control points [N, 4, 2] of the Hermite path"""
+    p0, p1 = start[:, :2], end[:, :2]
+    return np.stack([p0, p0 + start[:, 2:] * dt / 3, p1 - end[:, 2:] * dt / 3, p1], axis=1)
+
+
+def _squared_norm(coefficients):
+    """Coefficients [N, 7] of |p(s)|^2, lowest power first, for paths given by Hermite coefficients [4, N, 2]"""
+    poly = np.zeros((coefficients.shape[1], 7))
+    for i in range(4):
+        for j in range(4):
+            poly[:, i + j] += np.sum(coefficients[i] * coefficients[j], axis=1)
+    return poly
+
+
+def _first_root(poly):
+    """First s in [0, 1] where each polynomial [N, 7] (lowest power first) is <= 0, NaN if none"""
+    result = np.full(len(poly), np.nan)
+    for n, p in enumerate(poly):
+        if p[0] <= 0.0:
+            result[n] = 0.0
+            continue
+        roots = np.roots(p[::-1])  # Highest power first; leading zeros are trimmed
+        real = roots.real[np.abs(roots.imag) <= 1e-9 * (1.0 + np.abs(roots.real))]
+        real = real[(real >= 0.0) & (real <= 1.0)]
+        if len(real):
+            result[n] = real.min()
+    return result
+
+
+def first_contact(coefficients, radius):
+    """First s in [0, 1] with |p(s)| <= radius for paths given by Hermite coefficients [4, N, 2], NaN if none"""
+    poly = _squared_norm(coefficients)
+    poly[:, 0] -= radius**2
+    return _first_root(poly)
+
+
+def first_exit(coefficients, radius):
+    """First s in [0, 1] with |p(s)| >= radius, NaN if none"""
+    poly = -_squared_norm(coefficients)
+    poly[:, 0] += radius**2
+    return _first_root(poly)
+
+
+def boundary_crossings(start, end, dt, r_min, r_max):
+    """
+    Earliest crossing of the inner (r_min) or outer (r_max) boundary for each ship during the step.
+    Returns: Tuple of (s [N], NaN where there is none; inner [N], True where the crossing is the inner one).
+    """
+    ctrl = control_points(start, end, dt)
+    # Nearest point of the control points' bounding box to the star; farthest control point from it
+    lo, hi = ctrl.min(axis=1), ctrl.max(axis=1)
+    nearest = np.sqrt(np.sum(np.maximum(np.maximum(lo, -hi), 0.0)**2, axis=1))
+    farthest = np.sqrt(np.max(np.sum(ctrl**2, axis=2), axis=1))
+
+    s_inner = np.full(len(start), np.nan)
+    s_outer = np.full(len(start), np.nan)
+    near = np.flatnonzero(nearest < r_min)
+    if len(near):
+        s_inner[near] = first_contact(hermite_coefficients(start[near], end[near], dt), r_min)
+    far = np.flatnonzero(farthest > r_max)
+    if len(far):
+        s_outer[far] = first_exit(hermite_coefficients(start[far], end[far], dt), r_max)
+
+    inner = ~np.isnan(s_inner) & ~(s_outer < s_inner)
+    return np.where(inner, s_inner, s_outer), inner
+
+
+def may_cross_one(x0, y0, vx0, vy0, x1, y1, vx1, vy1, dt, r_min, r_max):
+    """Scalar version of the boundary_crossings filter for one ship: False if no crossing is possible"""
+    px = (x0, x0 + vx0 * dt / 3, x1 - vx1 * dt / 3, x1)
+    py = (y0, y0 + vy0 * dt / 3, y1 - vy1 * dt / 3, y1)
+    nx = max(min(px), -max(px), 0.0)
+    ny = max(min(py), -max(py), 0.0)
+    if math.sqrt(nx*nx + ny*ny) < r_min:
+        return True
+    return max(x*x + y*y for x, y in zip(px, py)) > r_max * r_max
+
+
+def sweep_and_prune(ctrl, radius):
+    """
+    Broadphase for ship-to-ship contacts: pairs whose swept bounding boxes, grown by radius / 2, overlap.
+    Boxes are sorted along x and each one is only tested against the boxes that start before it ends.
+    Args:
+        ctrl: Bezier control points [N, 4, 2] of every ship's path.
+        radius: Contact distance between ship centres (float).
+    Returns: Index arrays (i, j) of the candidate pairs, i < j.
+    """
+    lo = ctrl.min(axis=1) - radius / 2
+    hi = ctrl.max(axis=1) + radius / 2
+    order = np.argsort(lo[:, 0], kind='stable')
+    x_lo = lo[order, 0]
+    ends = np.searchsorted(x_lo, hi[order, 0], side='right')
+    counts = np.maximum(ends - np.arange(len(order)) - 1, 0)
+
+    first = np.repeat(np.arange(len(order)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    i, j = order[first], order[first + 1 + offsets]
+    overlap = (lo[i, 1] <= hi[j, 1]) & (lo[j, 1] <= hi[i, 1])
+    i, j = i[overlap], j[overlap]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def ship_contacts(start, end, dt, radius):
+    """
+    Earliest time of impact between pairs of ships that come within `radius` of each other during the step.
+    Returns: Tuple of (i, j, s) for the touching pairs, with s the fraction of the step at first contact.
+    """
+    i, j = sweep_and_prune(control_points(start, end, dt), radius)
+    if len(i) == 0:
+        return i, j, np.empty(0)
+    c = hermite_coefficients(start, end, dt)
+    s = first_contact(c[:, i] - c[:, j], radius)
+    hit = ~np.isnan(s)
+    return i[hit], j[hit], s[hit]
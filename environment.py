@@ -1,13 +1,26 @@
+from collections.abc import Mapping, MutableMapping
+import pickle
+import math
 import numpy as np
 import gym
 from gym import spaces
+from gravity import DirectSum, BarnesHutTree, NeighborGrid
+from static_field import StaticGravityField
+from integrators import INTEGRATORS, DormandPrince, rk4_step, verlet_step, yoshida4_step
+import kepler
+import physics
+import collision
+from reference import HohmannReference
+from rewards import get_reward
+from recording import EpisodeRecorder
 
 # OrbitalEnvironment simulates a 2D gravitational orbital system.
 # Takes the gravitational constant (GM), initial radius (r0), initial velocity (v0), time step (dt),
 # maximum simulation steps, and an optional reward function.
 # Outputs the current state after each step (x, y, vx, vy) and reward.
 class OrbitalEnvironment:
-    def __init__(self, GM=1.0, r0=None, v0=1.0, dt=0.01, max_steps=5000, reward_function=None):
+    def __init__(self, GM=1.0, r0=None, v0=1.0, dt=0.01, max_steps=5000, reward_function=None, integrator='rk4',
+                 rtol=1e-8, atol=1e-10, backend=None, swept=True, track_conservation=False):
         """
         Args:
             GM: Gravitational constant (float).
@@ -15,11 +28,35 @@ class OrbitalEnvironment:
             v0: Initial velocity (float).
             dt: Time step for the simulation (float).
             max_steps: Maximum number of simulation steps (int).
-            reward_function: Optional function for calculating rewards. Defaults to exponential radial difference.
+            reward_function: Name of a reward in rewards.py (str), or a function of the thrust for calculating
+                             rewards. Defaults to 'radius', the exponential radial difference.
+            integrator: 'rk4' (4 force evaluations per step), 'verlet' (symplectic, 1), 'yoshida4'
+                        (symplectic 4th order, 3) or 'dopri5' (adaptive substeps with dense output) (str).
+            rtol, atol: Error tolerances of the 'dopri5' integrator (float).
+            backend: Physics kernel backend, 'python', 'numpy' or 'numba' (see physics.py). Defaults to the
+                     fastest one available (str or None).
+            swept: If True, boundary crossings are found anywhere along the step's path (see collision.py),
+                   so a large dt cannot tunnel through the star; otherwise only the end of the step is checked (bool).
+            track_conservation: If True, every step updates the specific energy and angular momentum, their
+                                reference values carried forward by the thrust work, and `drift`, the relative
+                                difference between the two, which is left to the integrator alone. On a step
+                                that crosses a boundary they describe the end of the step, before the ship is
+                                moved back to the crossing (bool).
 
         Returns:
             None. Initializes the orbital environment state.
         """
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Integrator '{integrator}' is not registered.")
+        self.integrator = integrator
+        self.kernel = physics.get_kernel(backend or physics.default_backend())
+        self.swept = swept
+        self.impact = 'none'      # 'star' or 'escape' once a boundary was crossed
+        self.impact_time = None   # Simulation time of that crossing
+        self.track_conservation = track_conservation
+        self._acc = None  # Acceleration at the current position, reused by velocity Verlet
+        self._dopri = DormandPrince(rtol=rtol, atol=atol) if integrator == 'dopri5' else None
+        self._coasting = False  # No thrust on the last step, so Dormand-Prince may continue its substeps
         self.GM = GM
         self.dt = dt
         self.init_r = r0 if r0 is not None else np.random.uniform(0.2, 4.0)
@@ -30,7 +67,10 @@ class OrbitalEnvironment:
         self.vy = np.sqrt(self.GM / self.init_r)
         self.max_steps = max_steps
         self.current_step = 0
-        self.reward_function = reward_function or self.default_reward
+        if reward_function is None or isinstance(reward_function, str):
+            reward = get_reward(reward_function or 'radius')
+            reward_function = lambda action: float(reward(self._reward_values(action)))
+        self.reward_function = reward_function
         self.reset()
 
     def reset(self):
@@ -43,12 +83,22 @@ class OrbitalEnvironment:
         self.vx = 0.0
         self.vy = np.sqrt(self.GM / self.init_r)
         self.current_step = 0
+        self._acc = None
+        self._coasting = False
+        self.impact = 'none'
+        self.impact_time = None
+        if self.track_conservation:
+            self.energy, self.angular_momentum = self._invariants()
+            self.energy_ref, self.angular_momentum_ref = self.energy, self.angular_momentum
+            self.thrust_work = 0.0    # Energy added by thrust so far
+            self.thrust_torque = 0.0  # Angular momentum added by thrust so far
+            self.drift = {'energy': 0.0, 'angular_momentum': 0.0}
         state = np.array([self.x, self.y, self.vx, self.vy])
         return state
     
     def step(self, action):
         """
-        Advances the environment state by one timestep using Runge-Kutta (RK4) integration.
+        Advances the environment state by one timestep using the configured integrator (RK4 by default).
         Args:
             action: Tangential thrust value (float).
 
@@ -59,94 +109,171 @@ class OrbitalEnvironment:
             - done: Boolean indicating whether the simulation is complete.
         """
         
-        # Helper to compute acceleration (gravity)
-        def acceleration(state):
-            x, y = state[:2]
-            dist = np.sqrt(x**2 + y**2)
-            dist = np.clip(dist, 1e-5, 5.0)
-            rhat = np.array([x, y]) / dist
-            return -self.GM / (dist**2) * rhat
-
-        # State format: [x, y, vx, vy]
-        state = np.array([self.x, self.y, self.vx, self.vy])
+        thrust = float(action[0])  # Tangential thrust only
+        start = (self.x, self.y, self.vx, self.vy)
+        if self.integrator == 'rk4':
+            self.x, self.y, self.vx, self.vy, out = self.kernel.step_one(
+                self.x, self.y, self.vx, self.vy, thrust, self.GM, self.dt)
+        elif self.integrator == 'verlet':
+            if self._acc is None:
+                self._acc = self.kernel.gravity_one(self.x, self.y, self.GM)
+            self.x, self.y, self.vx, self.vy, ax, ay, out = self.kernel.verlet_one(
+                self.x, self.y, self.vx, self.vy, *self._acc, thrust, self.GM, self.dt)
+            self._acc = (ax, ay)
+        elif self.integrator == 'yoshida4':
+            self.x, self.y, self.vx, self.vy, out = self.kernel.yoshida4_one(
+                self.x, self.y, self.vx, self.vy, thrust, self.GM, self.dt)
+        else:
+            # State format: [[x, y, vx, vy]]
+            state = np.array([[self.x, self.y, self.vx, self.vy]])
+            state = self._dopri.advance(state, self._derivative, self.dt, continuing=self._coasting)
+            self.x, self.y, self.vx, self.vy = state[0].tolist()
 
-        # RK4 integration steps
-        # k1
-        k1_v = self.dt * acceleration(state)
-        k1_p = self.dt * np.array([self.vx, self.vy])
-        
-        # k2
-        state_mid = state + 0.5 * np.concatenate([k1_p, k1_v])
-        k2_v = self.dt * acceleration(state_mid)
-        k2_p = self.dt * np.array([self.vx + 0.5 * k1_v[0], self.vy + 0.5 * k1_v[1]])
-        
-        # k3
-        state_mid = state + 0.5 * np.concatenate([k2_p, k2_v])
-        k3_v = self.dt * acceleration(state_mid)
-        k3_p = self.dt * np.array([self.vx + 0.5 * k2_v[0], self.vy + 0.5 * k2_v[1]])
-        
-        # k4
-        state_end = state + np.concatenate([k3_p, k3_v])
-        k4_v = self.dt * acceleration(state_end)
-        k4_p = self.dt * np.array([self.vx + k3_v[0], self.vy + k3_v[1]])
-
-        # Weighted average update
-        self.vx += (k1_v[0] + 2*k2_v[0] + 2*k3_v[0] + k4_v[0]) / 6
-        self.vy += (k1_v[1] + 2*k2_v[1] + 2*k3_v[1] + k4_v[1]) / 6
-        self.x  += (k1_p[0] + 2*k2_p[0] + 2*k3_p[0] + k4_p[0]) / 6
-        self.y  += (k1_p[1] + 2*k2_p[1] + 2*k3_p[1] + k4_p[1]) / 6
-
-        # Apply Thrust
-        action = np.array([0, action[0]])  # Tangential thrust only
-        dist = np.sqrt(self.x**2 + self.y**2)
-        dist = max(dist, 1e-5)  
-        rhat = np.array([self.x, self.y]) / dist
-        rotation_matrix = np.array([[rhat[0], -rhat[1]], [rhat[1], rhat[0]]])
-        thrust = rotation_matrix @ action
-
-        self.vx += thrust[0] * self.dt
-        self.vy += thrust[1] * self.dt
+            # Apply Thrust
+            self.vx, self.vy, out = self.kernel.finish_one(self.x, self.y, self.vx, self.vy, thrust, self.dt)
+        self._coasting = thrust == 0
+
+        # Invariants first: the thrust work is that of the whole step, so they must see the state at its end,
+        # before a boundary crossing moves the ship back along its path
+        if self.track_conservation:
+            self._track_conservation(thrust)
+        if self.swept and collision.may_cross_one(*start, self.x, self.y, self.vx, self.vy, self.dt,
+                                                  physics.R_MIN, physics.R_MAX):
+            self._swept_boundary(np.array([start]))
 
         # Update state
         state = np.array([self.x, self.y, self.vx, self.vy])
 
         # Update reward
-        reward = self.reward_function(action[1])
+        reward = self.reward_function(thrust)
 
         # Check if the episode is done
-        done = dist > 5.0 or dist < 0.1 or self.current_step >= self.max_steps
+        done = out or self.impact_time is not None or self.current_step >= self.max_steps
         self.current_step += 1
 
         return state, reward, done
 
+    def _swept_boundary(self, start):
+        """Moves the ship back to where its path over the last step first left the allowed annulus, if it did"""
+        end = np.array([[self.x, self.y, self.vx, self.vy]])
+        s, inner = collision.boundary_crossings(start, end, self.dt, physics.R_MIN, physics.R_MAX)
+        if np.isnan(s[0]):
+            return
+        self.x, self.y, self.vx, self.vy = collision.hermite_state(start, end, self.dt, s)[0].tolist()
+        self.impact = 'star' if inner[0] else 'escape'
+        self.impact_time = (self.current_step + s[0]) * self.dt
+
+    def _invariants(self):
+        """Specific orbital energy and angular momentum of the current state"""
+        energy = 0.5 * (self.vx**2 + self.vy**2) - self.GM / max(np.sqrt(self.x**2 + self.y**2), 1e-5)
+        return energy, self.x * self.vy - self.y * self.vx
+
+    def _track_conservation(self, thrust):
+        """Updates the invariants, their references and the drift after a step that ended with a thrust impulse"""
+        # The impulse is tangential with size thrust * dt, applied at the end position
+        dist = max(np.sqrt(self.x**2 + self.y**2), 1e-5)
+        dvx, dvy = -self.y / dist * thrust * self.dt, self.x / dist * thrust * self.dt
+        work = self.vx * dvx + self.vy * dvy - 0.5 * (dvx**2 + dvy**2)
+        torque = self.x * dvy - self.y * dvx
+        self.thrust_work += work
+        self.thrust_torque += torque
+        self.energy_ref += work
+        self.angular_momentum_ref += torque
+
+        self.energy, self.angular_momentum = self._invariants()
+        self.drift = {
+            'energy': abs(self.energy - self.energy_ref) / max(abs(self.energy_ref), 1e-12),
+            'angular_momentum': abs(self.angular_momentum - self.angular_momentum_ref)
+                                / max(abs(self.angular_momentum_ref), 1e-12),
+        }
+
+    def _acceleration(self, pos):
+        """Central gravity [N, 2] at positions pos [N, 2]"""
+        dist = np.sqrt(pos[:, :1]**2 + pos[:, 1:]**2)
+        dist = np.clip(dist, 1e-5, 5.0)
+        rhat = pos / dist
+        return -self.GM / (dist**2) * rhat
+
+    def _derivative(self, state):
+        return np.concatenate([state[:, 2:], self._acceleration(state[:, :2])], axis=1)
+
+    def _reward_values(self, action):
+        """The current state as scalars for the rewards in rewards.py"""
+        x, y = float(self.x), float(self.y)
+        return {
+            'x': x, 'y': y, 'vx': float(self.vx), 'vy': float(self.vy),
+            'r': math.hypot(x, y),
+            'action': float(action),
+            'init_r': float(self.init_r),
+            'r_final': 1.0,
+        }
+
     def default_reward(self, action):
-        r = np.sqrt(self.x**2 + self.y**2)
-        r_err = r - 1.0
-        r_max_err = max(abs(self.init_r - 1), 1e-2)
-        scaled_r_err = np.clip((r_err / r_max_err) * 2, -2, 2)
-        reward = np.exp(-scaled_r_err**2)
-        action_penalty = np.exp(-action**2)
-        return reward * action_penalty
+        return float(get_reward('radius')(self._reward_values(action)))
 
 class OrbitalEnvWrapper(gym.Env):
-    def __init__(self, r0=None, reward_function=None):
+    EPISODE_FIELDS = ('x', 'y', 'vx', 'vy', 'reward', 'action', 'r_err_norm', 'd_r_err_norm', 'int_r_err_norm')
+
+    def __init__(self, r0=None, reward_function=None, reward='hohmann', action_repeat=1, record='off'):
+        """
+        Args:
+            r0: Initial orbital radius (float). If None, a random value is generated.
+            reward_function: Reward of the inner OrbitalEnvironment, see there (str, function or None).
+            reward: Name of the training reward in rewards.py, computed from the Hohmann tracking errors (str).
+            action_repeat: Physics steps per step() call with the action held; their rewards are summed and the
+                           call ends early if the episode does (int).
+            record: Recording level of every physics step's EPISODE_FIELDS, 'off', 'summary' or 'full'
+                    (see recording.py). Off by default; training records through SaveBest instead (str).
+        """
+        if int(action_repeat) < 1:
+            raise ValueError(f"Action repeat '{action_repeat}' must be at least 1.")
         super(OrbitalEnvWrapper, self).__init__()
         self.env = OrbitalEnvironment(r0=r0, reward_function=reward_function)
+        self.reward = get_reward(reward)
+        self.action_repeat = int(action_repeat)
+        self.reference = HohmannReference(GM=self.env.GM, r_final=1.0, dt=self.env.dt)
+        self.r_table = None        # r_expected per step of this episode's transfer
+        self.transfer_time = None
         self.action_space = spaces.Box(low=-1.0, high=1.0, shape=(1,), dtype=np.float32)
-        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(9,), dtype=np.float32)
+        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32)
         self.state = None
-        self.episode_data = []
+        self.recorder = EpisodeRecorder(self.EPISODE_FIELDS, level=record)
         self.prev_r_err = None
         self.integral_r_err = 0.0
 
     def reset(self):
-        self.episode_data = []
+        self.recorder.reset()
         self.state = self.env.reset()
         self.prev_r_err = None
         self.integral_r_err = 0.0
+        self.r_table = self.reference.table(self.env.init_r, cache=self.env.enforce_r)
+        self.transfer_time = float(self.reference.transfer(self.env.init_r)['transfer_time'])
         return self._convert_state(self.state, 0.0, 0.0)
 
     def step(self, action):
+        total_reward = 0.0
+        for _ in range(self.action_repeat):
+            reward, done, r_err_norm, d_r_err_norm, int_r_err_norm = self._substep(action)
+            total_reward += reward
+            if done:
+                break
+
+        x, y, vx, vy = self.state
+        info = {
+            "state": (x, y, vx, vy),
+            "r_err_norm": r_err_norm,
+            "d_r_err_norm": d_r_err_norm,
+            "int_r_err_norm": int_r_err_norm
+        }
+
+        observation = self._convert_state(self.state, d_r_err_norm, int_r_err_norm)
+        return observation, total_reward, done, info
+
+    def _substep(self, action):
+        """
+        One physics step of the inner environment and its Hohmann tracking reward.
+        Returns: Tuple of (reward, done, r_err_norm, d_r_err_norm, int_r_err_norm).
+        """
         self.state, base_reward, done = self.env.step(action)
 
         # Extract state variables
@@ -154,23 +281,11 @@ class OrbitalEnvWrapper(gym.Env):
         r = np.sqrt(x**2 + y**2)
         t = self.env.current_step * self.env.dt
 
-        # Constants for Hohmann transfer
+        # Expected radius (Target) along the Hohmann transfer, precomputed for this episode
         r_initial = self.env.init_r
-        r_final = 1.0
-        transfer_time = np.pi * np.sqrt(((r_initial + r_final) / 2)**3 / self.env.GM)
-
-        # Compute expected radius (Target)
-        if t < transfer_time:
-            a_transfer = (r_initial + r_final) / 2
-            e_transfer = (r_final - r_initial) / (r_final + r_initial)
-            n_transfer = np.sqrt(self.env.GM / a_transfer**3)
-            M = n_transfer * t
-            E = M  # Approximation for small eccentricities
-            theta = 2 * np.arctan2(np.sqrt(1 + e_transfer) * np.sin(E / 2),
-                                np.sqrt(1 - e_transfer) * np.cos(E / 2))
-            r_expected = a_transfer * (1 - e_transfer**2) / (1 + e_transfer * np.cos(theta))
-        else:
-            r_expected = r_final
+        r_final = self.reference.r_final
+        transfer_time = self.transfer_time
+        r_expected = self.reference.lookup(self.r_table, self.env.current_step)
 
         # Compute errors
         r_err = r - r_expected
@@ -184,34 +299,29 @@ class OrbitalEnvWrapper(gym.Env):
         d_r_err_norm = d_r_err / (r_expected / transfer_time)
         int_r_err_norm = self.integral_r_err / (r_expected * max_timesteps_passed)
 
-        # Penalties
-        time_factor = t / max_timesteps_passed
-        k1, k2, k3 = 1.0, 1.0, 1.0
-        penalty_r_err = np.exp(-k1 * abs(r_err_norm) * (1 + time_factor))
-        penalty_d_r_err = np.exp(-k2 * abs(d_r_err_norm) * (1 + time_factor))
-        penalty_int_r_err = np.exp(-k3 * abs(int_r_err_norm) * (1 + time_factor))
+        # Reward from the registry, on scalars
+        reward = float(self.reward({
+            'x': x, 'y': y, 'vx': vx, 'vy': vy,
+            'r': r,
+            'action': float(action[0]),
+            'init_r': r_initial,
+            'r_final': r_final,
+            'r_err_norm': r_err_norm,
+            'd_r_err_norm': d_r_err_norm,
+            'int_r_err_norm': int_r_err_norm,
+            'time_factor': t / max_timesteps_passed,
+        }))
 
-        base_reward = 1.0
-        reward = base_reward * penalty_r_err * penalty_d_r_err * penalty_int_r_err
-        min_reward = 0.01
-        reward = max(reward, min_reward)
+        if self.recorder.level != 'off':
+            self.recorder.record((x, y, vx, vy, reward, action[0], r_err_norm, d_r_err_norm, int_r_err_norm))
+        return reward, done, r_err_norm, d_r_err_norm, int_r_err_norm
 
-        if r > 2 * r_final or r < r_initial / 2:
-            reward = min_reward
-
-        self.episode_data.append([
-            x, y, vx, vy, reward, action[0], r_err_norm, d_r_err_norm, int_r_err_norm
-        ])
-
-        info = {
-            "state": (x, y, vx, vy),
-            "r_err_norm": r_err_norm,
-            "d_r_err_norm": d_r_err_norm,
-            "int_r_err_norm": int_r_err_norm
-        }
-
-        observation = self._convert_state(self.state, d_r_err_norm, int_r_err_norm)
-        return observation, reward, done, info
+    @property
+    def episode_data(self):
+        """Steps of the current episode as rows [steps, 9] in EPISODE_FIELDS order ('full' recording only)"""
+        if self.recorder.level != 'full':
+            raise ValueError(f"Recording level '{self.recorder.level}' does not keep episode data.")
+        return self.recorder.buffer[:, :len(self.recorder)].T
 
     def _convert_state(self, state, d_r_err_norm, int_r_err_norm):
         x, y, vx, vy = state
@@ -241,175 +351,778 @@ class OrbitalEnvWrapper(gym.Env):
         return state
 
 
+# Control type codes stored in ShipStore.control_type (index = code).
+CONTROL_TYPES = ('ai', 'manual')
+AI_CONTROL = 0
+MANUAL_CONTROL = 1
+
+# What ended a ship's flight, stored in ShipStore.impact (index = code).
+IMPACT_TYPES = ('none', 'star', 'escape', 'ship')
+IMPACT_NONE = 0
+IMPACT_STAR = 1
+IMPACT_ESCAPE = 2
+IMPACT_SHIP = 3
+
+
+class ShipStore(Mapping):
+    """
+    Struct-of-arrays ship storage for MultiShipOrbitalEnvironment.
+    Every field lives in its own contiguous NumPy array; live ships occupy slots [0, len(store))
+    and `index` maps ship_id -> slot. Removing a ship moves the last slot into the hole, so the
+    live range stays dense and the physics can work on plain slices.
+
+    Mapping access (store[ship_id]) returns a ShipView, so code written against the old
+    {ship_id: state dict} layout keeps working.
+    """
+    FIELDS = {
+        'x': np.float64,
+        'y': np.float64,
+        'vx': np.float64,
+        'vy': np.float64,
+        'init_r': np.float64,
+        'done': np.bool_,
+        'control_type': np.int8,  # AI_CONTROL or MANUAL_CONTROL
+        'heading': np.float64,
+        'thrust': np.float64,
+        'turn_rate': np.float64,
+        'steps': np.int64,
+        'tangential_thrust': np.float64,
+        'impact': np.int8,          # IMPACT_* code of the event that ended the flight
+        'impact_time': np.float64,  # Simulation time of that event, -1 while flying
+        # Orbital elements about the star, recomputed once per tick (see kepler.elements)
+        'r': np.float64,
+        'v_radial': np.float64,
+        'v_tangential': np.float64,
+        'energy': np.float64,  # Specific orbital energy
+        'angular_momentum': np.float64,
+        'semi_major_axis': np.float64,  # inf for parabolic orbits, negative for hyperbolic ones
+        'eccentricity': np.float64,
+    }
+    ELEMENT_FIELDS = ('r', 'v_radial', 'v_tangential', 'energy', 'angular_momentum', 'semi_major_axis',
+                      'eccentricity')
+    # Fields stored as codes and exposed as the names in these tuples
+    ENUM_FIELDS = {'control_type': CONTROL_TYPES, 'impact': IMPACT_TYPES}
+    # Engine-side state that is stored per slot but not exposed through ShipView / get_states
+    INTERNAL_FIELDS = {
+        'kepler_valid': np.bool_,  # Epoch below describes the ship's current coasting orbit
+        'epoch_x': np.float64,
+        'epoch_y': np.float64,
+        'epoch_vx': np.float64,
+        'epoch_vy': np.float64,
+        'epoch_t': np.float64,     # Time since the epoch
+        'kepler_chi': np.float64,  # Last universal anomaly, warm start for the next solve
+        'pert_valid': np.bool_,    # Cached ship-to-ship acceleration below is usable
+        'pert_ax': np.float64,     # Ship-to-ship acceleration at the last refresh
+        'pert_ay': np.float64,
+        'pert_rate_x': np.float64,  # Its change per tick between the last two refreshes
+        'pert_rate_y': np.float64,
+        'pert_age': np.int64,       # Ticks since the last refresh
+        'pert_interval': np.int64,  # Ticks between refreshes for this ship
+        'conservation_valid': np.bool_,  # References below have been initialised
+        'energy_ref': np.float64,        # Energy it would have without integration error
+        'angular_momentum_ref': np.float64,
+        'thrust_work': np.float64,       # Energy added by thrust so far
+        'thrust_torque': np.float64,     # Angular momentum added by thrust so far
+        'perturbation_work': np.float64,  # Energy added by ship-to-ship gravity so far
+        'perturbation_torque': np.float64,
+    }
+
+    def __init__(self, capacity=16):
+        self.capacity = max(int(capacity), 1)
+        self.index = {}  # ship_id: slot (insertion ordered)
+        self.ids = []    # slot: ship_id
+        self.version = 0  # Bumped whenever ships are added, removed or moved between slots
+        for name, dtype in {**self.FIELDS, **self.INTERNAL_FIELDS}.items():
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+
+    def __getitem__(self, ship_id):
+        if ship_id not in self.index:
+            raise KeyError(ship_id)
+        return ShipView(self, ship_id)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, ship_id):
+        return ship_id in self.index
+
+    def add(self, ship_id, **values):
+        """Adds (or overwrites) a ship and returns its slot. Unspecified fields are zeroed."""
+        self.version += 1
+        slot = self.index.get(ship_id)
+        if slot is None:
+            if len(self.ids) == self.capacity:
+                self._grow()
+            slot = len(self.ids)
+            self.index[ship_id] = slot
+            self.ids.append(ship_id)
+        for name in (*self.FIELDS, *self.INTERNAL_FIELDS):
+            getattr(self, name)[slot] = values.get(name, 0)
+        return slot
+
+    def remove(self, ship_id):
+        """Removes a ship, filling its slot with the last live ship."""
+        self.version += 1
+        slot = self.index.pop(ship_id)
+        last = len(self.ids) - 1
+        if slot != last:
+            moved_id = self.ids[last]
+            for name in (*self.FIELDS, *self.INTERNAL_FIELDS):
+                arr = getattr(self, name)
+                arr[slot] = arr[last]
+            self.ids[slot] = moved_id
+            self.index[moved_id] = slot
+        self.ids.pop()
+
+    def clear(self):
+        self.version += 1
+        self.index.clear()
+        self.ids.clear()
+
+    def column(self, name):
+        """Returns a view of field `name` over the live slots."""
+        return getattr(self, name)[:len(self.ids)]
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in (*self.FIELDS, *self.INTERNAL_FIELDS):
+            old = getattr(self, name)
+            arr = np.zeros(self.capacity, dtype=old.dtype)
+            arr[:len(old)] = old
+            setattr(self, name, arr)
+
+
+class ShipView(MutableMapping):
+    """
+    Dict-style view of one ship inside a ShipStore. Reads and writes go straight to the arrays,
+    and the slot is looked up on every access so views stay valid when other ships are removed.
+    """
+    __slots__ = ('_store', '_ship_id')
+
+    def __init__(self, store, ship_id):
+        self._store = store
+        self._ship_id = ship_id
+
+    def __getitem__(self, key):
+        if key not in ShipStore.FIELDS:
+            raise KeyError(key)
+        value = getattr(self._store, key)[self._store.index[self._ship_id]].item()
+        if key in ShipStore.ENUM_FIELDS:
+            return ShipStore.ENUM_FIELDS[key][value]
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in ShipStore.FIELDS:
+            raise KeyError(key)
+        if key in ShipStore.ENUM_FIELDS:
+            value = ShipStore.ENUM_FIELDS[key].index(value)
+        getattr(self._store, key)[self._store.index[self._ship_id]] = value
+
+    def __delitem__(self, key):
+        raise KeyError(f"Ship field '{key}' cannot be deleted")
+
+    def __iter__(self):
+        return iter(ShipStore.FIELDS)
+
+    def __len__(self):
+        return len(ShipStore.FIELDS)
+
+    def __repr__(self):
+        return f"ShipView({self._ship_id!r}, {dict(self)!r})"
+
+
 class MultiShipOrbitalEnvironment:
     """
     Manages multiple ships in a shared orbital environment, where each ship can be controlled independently
     and all ships interact gravitationally.
+    Ship state is kept in a ShipStore (one array per field) and every step is applied to all ships at once.
     """
-    def __init__(self, GM=1.0, dt=0.01, max_steps=None):
+    PERTURBATIONS = ('direct', 'barnes_hut', 'grid')
+    PERTURBATION_PREDICTORS = ('hold', 'linear')
+    PERTURBATION_ETA = 0.02  # Fraction of the perturbation's timescale a ship may go without a refresh ('auto')
+
+    def __init__(self, GM=1.0, dt=0.01, max_steps=None, coupled=False, perturbation='direct', theta=0.5,
+                 cutoff=1.0, integrator='rk4', rtol=1e-8, atol=1e-10, kepler_threshold=None, backend=None,
+                 perturbation_interval=1, perturbation_predictor='hold', max_perturbation_interval=16,
+                 swept=True, collision_radius=None, track_conservation=False, seed=None, static_bodies=None,
+                 action_repeat=1):
+        """
+        Args:
+            GM: Gravitational constant of the central star (float).
+            dt: Time step for the simulation (float).
+            max_steps: Maximum number of simulation steps (int or None).
+            coupled: If True, all ships are integrated as one coupled N-body system, so every stage sees the
+                     other ships at their stage positions. If False, each ship feels the others frozen at
+                     their start-of-step positions (bool).
+            perturbation: Solver for the ship-to-ship term: 'direct' (exact pairwise sum), 'barnes_hut'
+                          (quadtree, O(N log N)) or 'grid' (only ships within `cutoff`, close to O(N)) (str).
+            theta: Barnes-Hut opening angle, see benchmark.py for accuracy versus the direct sum (float).
+            cutoff: Interaction radius for the 'grid' solver (float).
+            integrator: 'rk4', 'verlet', 'yoshida4' or 'dopri5', see OrbitalEnvironment. Dormand-Prince
+                        uses one adaptive step size for the whole system (str).
+            rtol, atol: Error tolerances of the 'dopri5' integrator (float).
+            kepler_threshold: If set, ships without thrust whose ship-to-ship (plus static-body) acceleration is below
+                              this value skip the integrator and follow their two-body orbit analytically
+                              (float or None).
+            backend: Physics kernel backend for thrust and boundary checks (see physics.py). Defaults to the
+                     fastest one available for arrays of ships (str or None).
+            perturbation_interval: Multi-rate mode. Central gravity and thrust are integrated every stage, while
+                                   ship-to-ship accelerations are recomputed every k ticks per ship and held
+                                   constant over each tick in between. 1 recomputes them at every stage as usual;
+                                   'auto' picks k per ship from the timescale |a| / |da/dt| of its perturbation,
+                                   which for a close pair is about distance / relative speed (int or 'auto').
+            perturbation_predictor: Between refreshes, 'hold' the last perturbation or extrapolate it 'linear'ly
+                                    from the last two refreshes (str).
+            max_perturbation_interval: Upper bound on k in 'auto' mode (int).
+            swept: If True, boundary crossings are found anywhere along each step's path instead of only at its
+                   end, and ships stop where they crossed (bool).
+            collision_radius: If set, ships whose paths come within this distance of each other during a step
+                              collide and are done; found with a sweep-and-prune broadphase (float or None).
+            track_conservation: If True, every step updates each ship's specific energy and angular momentum
+                                and their references, which follow the thrust work (exact, thrust is constant over
+                                a step) and the ship-to-ship work (trapezoidal, from two extra perturbation
+                                evaluations). What is left is drift from the integrator, dt and the approximations
+                                chosen above; `drift_summary` reports its max and mean over the flying ships.
+                                The trapezoidal rule needs the perturbation to change little over a step, so in
+                                close encounters (crowded runs, ships passing within a few dt * speed of each
+                                other) the ship-to-ship work is poorly estimated and drift can exceed 1 without
+                                the integration being wrong; compare drift across settings in sparse runs (bool).
+            seed: Seed of the environment's random generator, used for random starting radii (int or None).
+            static_bodies: Fixed attractors besides the central star (binary companions, moons held in place), as
+                           (x, y, GM) tuples or a prebuilt StaticGravityField. Their pull is summed directly and
+                           counted with central gravity; orbital elements, the Kepler fast path's orbits and
+                           predict_coasting() still only see the central star (list or None).
+            action_repeat: Physics ticks run by every step() call with the actions held, so controllers decide
+                           once per action_repeat * dt of simulated time (int).
+        """
+        if perturbation not in self.PERTURBATIONS:
+            raise ValueError(f"Perturbation solver '{perturbation}' is not registered.")
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Integrator '{integrator}' is not registered.")
+        if perturbation_predictor not in self.PERTURBATION_PREDICTORS:
+            raise ValueError(f"Perturbation predictor '{perturbation_predictor}' is not registered.")
+        if perturbation_interval != 'auto' and int(perturbation_interval) < 1:
+            raise ValueError(f"Perturbation interval '{perturbation_interval}' must be 'auto' or at least 1.")
+        if int(action_repeat) < 1:
+            raise ValueError(f"Action repeat '{action_repeat}' must be at least 1.")
         self.GM = GM
         self.dt = dt
         self.max_steps = max_steps
-        self.ships = {}  # ship_id: state dict
+        self.coupled = coupled
+        self.perturbation = perturbation
+        self.theta = theta
+        self.cutoff = cutoff
+        self._grid = None  # NeighborGrid kept between ticks so it can re-bin incrementally
+        self.integrator = integrator
+        self._verlet_cache = None  # ((store version, slots), gravity) from the end of the last Verlet step
+        self._dopri = DormandPrince(rtol=rtol, atol=atol) if integrator == 'dopri5' else None
+        self._dopri_key = None  # (store version, slots, thrust) of the last Dormand-Prince tick
+        self.kepler_threshold = kepler_threshold
+        self.perturbation_interval = perturbation_interval
+        self.perturbation_predictor = perturbation_predictor
+        self.max_perturbation_interval = max_perturbation_interval
+        self.multirate = perturbation_interval != 1
+        self.swept = swept
+        self.collision_radius = collision_radius
+        self.track_conservation = track_conservation
+        self.drift_summary = None  # Drift statistics of the last step when tracking conservation (see above)
+        self.rng = np.random.default_rng(seed)
+        if static_bodies is not None and not isinstance(static_bodies, StaticGravityField):
+            static_bodies = StaticGravityField(static_bodies)
+        self.static_field = static_bodies
+        self.action_repeat = int(action_repeat)
+        self.kernel = physics.get_kernel(backend or physics.default_backend(batched=True))
+        self.ships = ShipStore()  # ship_id: ShipView (backed by contiguous arrays)
         self.current_step = 0
 
     def add_ship(self, ship_id, r0=None, v0=1.0, control_type='ai'):
         if r0 is None:
-            r0 = np.random.uniform(0.2, 4.0)
-            
-        x = r0
-        y = 0.0
-        vx = 0.0
-        vy = np.sqrt(self.GM / r0)
-        self.ships[ship_id] = {
-            'x': x, 'y': y, 'vx': vx, 'vy': vy, 'init_r': r0, 'done': False,
-            'control_type': control_type,  # 'ai' or 'manual'
-            'heading': 0.0,
-            'thrust': 0.0,
-            'turn_rate': 0.0,
-            'steps': 0,
-            'tangential_thrust': 0.0
-        }
+            r0 = self.rng.uniform(0.2, 4.0)
+
+        self.ships.add(
+            ship_id,
+            x=r0, y=0.0, vx=0.0, vy=np.sqrt(self.GM / r0), init_r=r0, done=False,
+            control_type=CONTROL_TYPES.index(control_type),  # 'ai' or 'manual'
+            heading=0.0, thrust=0.0, turn_rate=0.0, steps=0, tangential_thrust=0.0,
+            impact=IMPACT_NONE, impact_time=-1.0,
+        )
+        self._update_elements(np.array([self.ships.index[ship_id]]))
 
     def remove_ship(self, ship_id):
         if ship_id in self.ships:
-            del self.ships[ship_id]
-    
+            self.ships.remove(ship_id)
+
     def reset(self):
         self.ships.clear()
         self.current_step = 0
+        self._grid = None
+        self._verlet_cache = None
+        self._dopri_key = None
 
     def step(self, actions):
         """
+        Runs action_repeat physics ticks with the same actions.
         actions: dict of {ship_id: action}
         """
-        # Gather all positions for mutual gravity
-        positions = {sid: (s['x'], s['y']) for sid, s in self.ships.items() if not s['done']}
-        
-        for ship_id, ship in self.ships.items():
-            if ship['done']:
-                continue
-                
-            ship['steps'] += 1
-                
-            if ship['control_type'] == 'ai':
-                action = actions.get(ship_id, 0.0)
-                self._apply_ai_control(ship, action)
-
-            elif ship['control_type'] == 'manual':
-                action = actions.get(ship_id, {'turn': 0.0, 'thrust': 0.0})
-                self._apply_manual_control(ship, action)
-            
-            # Apply physics with corrected RK4
-            self._apply_physics(ship, positions, ship_id)
-            
-            dist = np.sqrt(ship['x']**2 + ship['y']**2)
-            if dist > 5.0 or dist < 0.1:
-                ship['done'] = True
-                
+        for _ in range(self.action_repeat):
+            self._tick(actions)
+
+    def _tick(self, actions):
+        ships = self.ships
+        active = np.flatnonzero(~ships.column('done'))
+
+        if len(active):
+            ships.steps[active] += 1
+            self._apply_controls(actions, active)
+            start = self._states(active)
+            if self.track_conservation:
+                start_forces = self._begin_conservation(active, start)
+            self._apply_physics(active)
+            if self.swept or self.collision_radius is not None:
+                self._detect_events(active, start)
+            else:
+                out = self.kernel.out_of_bounds(ships.x[active], ships.y[active])
+                ships.done[active] = out
+                self._record_impacts(active[out], ships.x[active[out]], ships.y[active[out]])
+            self._update_elements(active)
+            if self.track_conservation:
+                self._end_conservation(active, start, *start_forces)
+
         self.current_step += 1
 
-    def _apply_ai_control(self, ship, action):
-        ship['tangential_thrust'] = action
+    def _states(self, idx):
+        ships = self.ships
+        return np.stack([ships.x[idx], ships.y[idx], ships.vx[idx], ships.vy[idx]], axis=1)
 
-    def _apply_manual_control(self, ship, action):
-        ship['turn_rate'] = action.get('turn', 0.0)
-        ship['heading'] += ship['turn_rate'] * self.dt
-        ship['thrust'] = action.get('thrust', 0.0)
-        
-        if 'heading' not in ship:
-            ship['heading'] = 0.0
+    def _update_elements(self, idx):
+        """Recomputes the orbital element fields of the ships in slots idx from their current state"""
+        ships = self.ships
+        for name, values in kepler.elements(ships.x[idx], ships.y[idx], ships.vx[idx], ships.vy[idx],
+                                            self.GM).items():
+            getattr(ships, name)[idx] = values
+
+    def _invariants(self, state):
+        """Specific orbital energy and angular momentum [N] of states [N, 4]"""
+        x, y, vx, vy = state.T
+        energy = 0.5 * (vx**2 + vy**2) - self.GM / np.maximum(np.sqrt(x**2 + y**2), 1e-5)
+        return energy, x * vy - y * vx
+
+    def _begin_conservation(self, idx, start):
+        """Initialises the references of new ships; returns the thrust and perturbation at the start of the step"""
+        ships = self.ships
+        new = idx[~ships.conservation_valid[idx]]
+        energy, momentum = self._invariants(start[~ships.conservation_valid[idx]])
+        ships.energy_ref[new], ships.angular_momentum_ref[new] = energy, momentum
+        ships.thrust_work[new] = ships.thrust_torque[new] = 0.0
+        ships.perturbation_work[new] = ships.perturbation_torque[new] = 0.0
+        ships.conservation_valid[new] = True
+
+        x, y = start[:, 0].copy(), start[:, 1].copy()
+        solver = self._perturbation_solver(x, y)
+        return self._thrust_acc(idx), solver.acceleration(x, y, np.arange(len(idx))) + self._static_acc(x, y)
+
+    def _end_conservation(self, idx, start, thrust_acc, perturbation):
+        """Adds the step's work to the references of the ships still flying and updates drift_summary"""
+        ships = self.ships
+        flying = ~ships.done[idx]
+        idx, start = idx[flying], start[flying]
+        thrust_acc, perturbation = thrust_acc[flying], perturbation[flying]
+        end = self._states(idx)
+        dt = self.dt
+
+        # Thrust is constant over the step: work = a . dr, torque = integral of r x a (Hermite path)
+        r_mean = 0.5 * (start[:, :2] + end[:, :2]) + dt * (start[:, 2:] - end[:, 2:]) / 12
+        thrust_work = np.sum(thrust_acc * (end[:, :2] - start[:, :2]), axis=1)
+        thrust_torque = dt * (r_mean[:, 0] * thrust_acc[:, 1] - r_mean[:, 1] * thrust_acc[:, 0])
+
+        # Ship-to-ship and static-body gravity vary, so use the trapezoidal rule between both ends of the step
+        x, y = end[:, 0].copy(), end[:, 1].copy()
+        end_perturbation = (self._perturbation_solver(x, y).acceleration(x, y, np.arange(len(idx)))
+                            + self._static_acc(x, y))
+        pert_work = 0.5 * dt * (np.sum(perturbation * start[:, 2:], axis=1)
+                                + np.sum(end_perturbation * end[:, 2:], axis=1))
+        pert_torque = 0.5 * dt * (start[:, 0] * perturbation[:, 1] - start[:, 1] * perturbation[:, 0]
+                                  + end[:, 0] * end_perturbation[:, 1] - end[:, 1] * end_perturbation[:, 0])
+
+        ships.thrust_work[idx] += thrust_work
+        ships.thrust_torque[idx] += thrust_torque
+        ships.perturbation_work[idx] += pert_work
+        ships.perturbation_torque[idx] += pert_torque
+        ships.energy_ref[idx] += thrust_work + pert_work
+        ships.angular_momentum_ref[idx] += thrust_torque + pert_torque
+
+        energy_drift = (np.abs(ships.energy[idx] - ships.energy_ref[idx])
+                        / np.maximum(np.abs(ships.energy_ref[idx]), 1e-12))
+        momentum_drift = (np.abs(ships.angular_momentum[idx] - ships.angular_momentum_ref[idx])
+                          / np.maximum(np.abs(ships.angular_momentum_ref[idx]), 1e-12))
+        self.drift_summary = {
+            'ships': len(idx),
+            'max_energy_drift': float(energy_drift.max()) if len(idx) else 0.0,
+            'mean_energy_drift': float(energy_drift.mean()) if len(idx) else 0.0,
+            'max_momentum_drift': float(momentum_drift.max()) if len(idx) else 0.0,
+            'mean_momentum_drift': float(momentum_drift.mean()) if len(idx) else 0.0,
+        }
+
+    def _detect_events(self, idx, start):
+        """
+        Finds the first event on each path over the last step (boundary crossing or, with collision_radius,
+        contact with another ship), marks those ships done and moves them back to where it happened.
+        """
+        ships = self.ships
+        end = self._states(idx)
+        s = np.full(len(idx), np.nan)
+        kind = np.full(len(idx), IMPACT_NONE, dtype=np.int8)
+        if self.swept:
+            s, inner = collision.boundary_crossings(start, end, self.dt, physics.R_MIN, physics.R_MAX)
+            kind = np.where(inner, IMPACT_STAR, IMPACT_ESCAPE).astype(np.int8)
+
+        if self.collision_radius is not None:
+            i, j, contact = collision.ship_contacts(start, end, self.dt, self.collision_radius)
+            # A contact only counts if neither ship left the annulus before it
+            valid = ~(s[i] < contact) & ~(s[j] < contact)
+            i, j, contact = i[valid], j[valid], contact[valid]
+            first = np.full(len(idx), np.inf)
+            np.minimum.at(first, i, contact)
+            np.minimum.at(first, j, contact)
+            hit = first < np.where(np.isnan(s), np.inf, s)
+            s[hit] = first[hit]
+            kind[hit] = IMPACT_SHIP
+
+        hit = np.flatnonzero(~np.isnan(s))
+        slots = idx[hit]
+        state = collision.hermite_state(start[hit], end[hit], self.dt, s[hit])
+        ships.x[slots], ships.y[slots], ships.vx[slots], ships.vy[slots] = state.T
+        ships.done[slots] = True
+        ships.impact[slots] = kind[hit]
+        ships.impact_time[slots] = (self.current_step + s[hit]) * self.dt
+
+        # End-of-step check for anything the swept tests are not looking for
+        out = self.kernel.out_of_bounds(end[:, 0], end[:, 1]) & np.isnan(s)
+        ships.done[idx[out]] = True
+        self._record_impacts(idx[out], end[out, 0], end[out, 1])
 
-    def _compute_acc(self, x, y, ship_id, positions):
-        """Helper to calculate total acceleration at a specific position"""
+    def _record_impacts(self, slots, x, y):
+        """Boundary impacts for ships found out of bounds at (x, y) at the end of the step"""
+        inner = np.sqrt(x**2 + y**2) < physics.R_MIN
+        self.ships.impact[slots] = np.where(inner, IMPACT_STAR, IMPACT_ESCAPE)
+        self.ships.impact_time[slots] = (self.current_step + 1) * self.dt
+
+    def _apply_controls(self, actions, active):
+        """Clears last tick's controls for the active ships and applies this tick's actions"""
+        ships = self.ships
+        is_ai = ships.control_type[active] == AI_CONTROL
+        manual = active[~is_ai]
+        ships.tangential_thrust[active[is_ai]] = 0.0
+        ships.turn_rate[manual] = 0.0
+        ships.thrust[manual] = 0.0
+
+        for ship_id, action in actions.items():
+            slot = ships.index.get(ship_id)
+            if slot is None or ships.done[slot]:
+                continue
+            if ships.control_type[slot] == AI_CONTROL:
+                self._apply_ai_control(slot, action)
+            else:
+                self._apply_manual_control(slot, action)
+
+        ships.heading[manual] += ships.turn_rate[manual] * self.dt
+
+    def _apply_ai_control(self, slot, action):
+        self.ships.tangential_thrust[slot] = action
+
+    def _apply_manual_control(self, slot, action):
+        self.ships.turn_rate[slot] = action.get('turn', 0.0)
+        self.ships.thrust[slot] = action.get('thrust', 0.0)
+
+    def _thrust_acc(self, idx):
+        """Thrust acceleration [len(idx), 2] for the ships in slots idx (constant during the timestep)"""
+        ships = self.ships
+        x, y = ships.x[idx], ships.y[idx]
+        control = ships.control_type[idx]
+        acc = np.zeros((len(idx), 2))
+
+        # AI uses tangential thrust: rhat rotated 90 degrees
+        ai = control == AI_CONTROL
+        acc[ai] = self.kernel.tangential_thrust(x[ai], y[ai], ships.tangential_thrust[idx[ai]])
+
+        # Manual uses heading
+        manual = (control == MANUAL_CONTROL) & (ships.thrust[idx] > 0)
+        heading = ships.heading[idx[manual]]
+        acc[manual, 0] = np.cos(heading) * ships.thrust[idx[manual]]
+        acc[manual, 1] = np.sin(heading) * ships.thrust[idx[manual]]
+        return acc
+
+    def _perturbation_solver(self, src_x, src_y):
+        """Builds the ship-to-ship gravity solver for sources at (src_x, src_y), once per tick"""
+        # Small pull from other ships (Mass = 0.1 * CentralStar)
+        if self.perturbation == 'barnes_hut':
+            return BarnesHutTree(src_x, src_y, self.GM * 0.1, theta=self.theta)
+        if self.perturbation == 'grid':
+            if self._grid is None:
+                self._grid = NeighborGrid(src_x, src_y, self.GM * 0.1, cutoff=self.cutoff)
+            else:
+                self._grid.update(src_x, src_y)
+            return self._grid
+        return DirectSum(src_x, src_y, self.GM * 0.1)
+
+    def _static_acc(self, x, y):
+        """Acceleration [len(x), 2] from the static bodies (zero without any)"""
+        if self.static_field is None:
+            return np.zeros((len(x), 2))
+        return self.static_field.acceleration(x, y)
+
+    def _central_acc(self, x, y):
+        """Acceleration [len(x), 2] from the central star and the static bodies on bodies at (x, y)"""
+        dist = np.maximum(np.sqrt(x**2 + y**2), 1e-5)
+        central = -self.GM / dist**3
+        acc = np.stack([central * x, central * y], axis=1)
+        if self.static_field is not None:
+            acc += self.static_field.acceleration(x, y)
+        return acc
+
+    def _compute_acc(self, x, y, solver, self_index):
+        """
+        Total acceleration [len(x), 2] on bodies at (x, y) from the central star, the static bodies and the
+        solver's ships.
+        Target i is solver source self_index[i], so that pair is skipped as self-gravity.
+        """
         # 1. Central Gravity
-        dist = np.sqrt(x**2 + y**2)
-        dist = max(dist, 1e-5)
-        rhat = np.array([x, y]) / dist
-        acc = -self.GM / (dist**2) * rhat
-        
+        acc = self._central_acc(x, y)
+
         # 2. Ship-to-Ship Gravity (Perturbations)
-        for other_id, (ox, oy) in positions.items():
-            # Skip self-gravity
-            if ship_id == other_id:
-                continue
-                
-            dx, dy = ox - x, oy - y
-            odist = np.sqrt(dx**2 + dy**2)
-            
-            if odist < 1e-3: continue # Collision/overlap safety
-            
-            o_rhat = np.array([dx, dy]) / odist
-            # Add small pull from other ships (Mass = 0.1 * CentralStar)
-            acc += (self.GM * 0.1) / (odist**2) * o_rhat
-            
+        acc += solver.acceleration(x, y, self_index)
         return acc
 
-    def _apply_physics(self, ship, positions, ship_id):
-        """Apply physics using Proper RK4 Integration"""
-        x, y = ship['x'], ship['y']
-        vx, vy = ship['vx'], ship['vy']
-        
-        # Define the thrust vector (constant during the timestep)
-        thrust_acc = np.array([0.0, 0.0])
-        
-        if ship['control_type'] == 'ai':
-            # AI uses tangential thrust
-            t_thrust = ship.get('tangential_thrust', 0.0)
-            dist = np.sqrt(x**2 + y**2)
-            if dist > 1e-5:
-                rhat = np.array([x, y]) / dist
-                # Rotate 90 degrees for tangent
-                rotation_matrix = np.array([[rhat[0], -rhat[1]], [rhat[1], rhat[0]]])
-                thrust_acc = rotation_matrix @ np.array([0, t_thrust])
-                
-        elif ship['control_type'] == 'manual':
-            # Manual uses heading
-            if ship.get('thrust', 0) > 0:
-                h = ship['heading']
-                thrust_acc = np.array([np.cos(h), np.sin(h)]) * ship['thrust']
-
-        # --- RK4 INTEGRATION ---
-        # Recalculate acceleration at each RK step using _compute_acc
-        
-        # k1
-        a1 = self._compute_acc(x, y, ship_id, positions) + thrust_acc
-        k1_v = self.dt * a1
-        k1_p = self.dt * np.array([vx, vy])
-        
-        # k2
-        mid_x = x + 0.5 * k1_p[0]
-        mid_y = y + 0.5 * k1_p[1]
-        a2 = self._compute_acc(mid_x, mid_y, ship_id, positions) + thrust_acc
-        k2_v = self.dt * a2
-        k2_p = self.dt * np.array([vx + 0.5 * k1_v[0], vy + 0.5 * k1_v[1]])
-        
-        # k3
-        mid_x = x + 0.5 * k2_p[0]
-        mid_y = y + 0.5 * k2_p[1]
-        a3 = self._compute_acc(mid_x, mid_y, ship_id, positions) + thrust_acc
-        k3_v = self.dt * a3
-        k3_p = self.dt * np.array([vx + 0.5 * k2_v[0], vy + 0.5 * k2_v[1]])
-        
-        # k4
-        end_x = x + k3_p[0]
-        end_y = y + k3_p[1]
-        a4 = self._compute_acc(end_x, end_y, ship_id, positions) + thrust_acc
-        k4_v = self.dt * a4
-        k4_p = self.dt * np.array([vx + k3_v[0], vy + k3_v[1]])
-        
-        # Weighted Sum
-        vx += (k1_v[0] + 2*k2_v[0] + 2*k3_v[0] + k4_v[0]) / 6.0
-        vy += (k1_v[1] + 2*k2_v[1] + 2*k3_v[1] + k4_v[1]) / 6.0
-        x  += (k1_p[0] + 2*k2_p[0] + 2*k3_p[0] + k4_p[0]) / 6.0
-        y  += (k1_p[1] + 2*k2_p[1] + 2*k3_p[1] + k4_p[1]) / 6.0
-        
+    def _cached_perturbation(self, idx, src_x, src_y):
+        """
+        Multi-rate mode: refreshes the ship-to-ship acceleration of the ships in slots idx that are due and
+        returns every ship's prediction for this tick [len(idx), 2], constant over the tick.
+        """
+        ships = self.ships
+        due = ~ships.pert_valid[idx] | (ships.pert_age[idx] >= ships.pert_interval[idx])
+        if np.any(due):
+            refresh = np.flatnonzero(due)
+            solver = self._perturbation_solver(src_x, src_y)
+            new = solver.acceleration(src_x[refresh], src_y[refresh], refresh)
+            slots = idx[refresh]
+            valid = ships.pert_valid[slots]
+            age = np.maximum(ships.pert_age[slots], 1)
+            ships.pert_rate_x[slots] = np.where(valid, (new[:, 0] - ships.pert_ax[slots]) / age, 0.0)
+            ships.pert_rate_y[slots] = np.where(valid, (new[:, 1] - ships.pert_ay[slots]) / age, 0.0)
+            ships.pert_ax[slots], ships.pert_ay[slots] = new.T
+            ships.pert_age[slots] = 0
+
+            if self.perturbation_interval == 'auto':
+                # Ticks until the perturbation has changed by PERTURBATION_ETA of itself
+                size = np.sqrt(new[:, 0]**2 + new[:, 1]**2)
+                rate = np.sqrt(ships.pert_rate_x[slots]**2 + ships.pert_rate_y[slots]**2)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ticks = np.where(valid & (rate > 0), self.PERTURBATION_ETA * size / rate, 1.0)
+                ships.pert_interval[slots] = np.clip(ticks, 1, self.max_perturbation_interval).astype(np.int64)
+            else:
+                ships.pert_interval[slots] = int(self.perturbation_interval)
+            ships.pert_valid[slots] = True
+
+        perturbation = np.stack([ships.pert_ax[idx], ships.pert_ay[idx]], axis=1)
+        if self.perturbation_predictor == 'linear':
+            # Value at the middle of this tick
+            ticks = ships.pert_age[idx] + 0.5
+            perturbation[:, 0] += ships.pert_rate_x[idx] * ticks
+            perturbation[:, 1] += ships.pert_rate_y[idx] * ticks
+        ships.pert_age[idx] += 1
+        return perturbation
+
+    def _apply_physics(self, idx):
+        """
+        Integrates the [N, 4] state of the ships in slots idx, all at once, with the configured integrator.
+        In coupled mode every force evaluation moves all bodies together; otherwise each ship feels the
+        others at their positions from the start of the step. With the Kepler fast path, coasting ships
+        are advanced analytically and act on the others from their start-of-step positions.
+        In multi-rate mode the ship-to-ship term comes from the per-ship cache instead.
+        """
+        ships = self.ships
+        start = self._states(idx)
+        thrust_acc = self._thrust_acc(idx)
+        src_x, src_y = start[:, 0].copy(), start[:, 1].copy()
+        if self.multirate:
+            solver = None
+            held = self._cached_perturbation(idx, src_x, src_y)
+        else:
+            solver = self._perturbation_solver(src_x, src_y)
+
+        moving = np.arange(len(idx))  # Positions in idx of the ships to integrate numerically
+        if self.kepler_threshold is not None:
+            perturbation = held if self.multirate else solver.acceleration(src_x, src_y, moving)
+            if self.static_field is not None:
+                perturbation = perturbation + self.static_field.acceleration(src_x, src_y)
+            moving = np.flatnonzero(~self._coast(idx, perturbation, thrust_acc))
+            if len(moving) == 0:
+                return
+        state = start[moving]
+        thrust_acc = thrust_acc[moving]
+        if self.multirate:
+            # The held perturbation is constant over the tick, just like thrust
+            thrust_acc = thrust_acc + held[moving]
+
+        def gravity(pos):
+            if self.multirate:
+                return self._central_acc(pos[:, 0], pos[:, 1])
+            if self.coupled:
+                src_x[moving] = pos[:, 0]
+                src_y[moving] = pos[:, 1]
+                solver.update(src_x, src_y)
+            return self._compute_acc(pos[:, 0], pos[:, 1], solver, moving)
+
+        def acceleration(pos):
+            return gravity(pos) + thrust_acc
+
+        def derivative(s):
+            return np.concatenate([s[:, 2:], acceleration(s[:, :2])], axis=1)
+
+        if self.integrator == 'rk4':
+            state = rk4_step(state, derivative, self.dt)
+        elif self.integrator == 'verlet':
+            # In coupled mode the final acceleration of this tick is the first one of the next,
+            # as long as the same ships are still flying
+            cache_key = (ships.version, idx.tobytes(), moving.tobytes())
+            acc = None
+            if self._verlet_cache is not None and self._verlet_cache[0] == cache_key:
+                acc = self._verlet_cache[1] + thrust_acc
+            state, acc = verlet_step(state, acceleration, self.dt, acc)
+            self._verlet_cache = (cache_key, acc - thrust_acc) if self.coupled or self.multirate else None
+        elif self.integrator == 'yoshida4':
+            state = yoshida4_step(state, acceleration, self.dt)
+        else:
+            # Substeps may only carry over between ticks if the right-hand side is unchanged:
+            # same ships, same thrust (and held perturbation), and other ships moving with the system
+            key = (ships.version, idx.tobytes(), moving.tobytes(), thrust_acc.tobytes())
+            continuing = (self.coupled or self.multirate) and key == self._dopri_key
+            self._dopri_key = key
+            state = self._dopri.advance(state, derivative, self.dt, continuing)
+
         # Update ship state
-        ship['x'], ship['y'] = x, y
-        ship['vx'], ship['vy'] = vx, vy
+        slots = idx[moving]
+        ships.x[slots], ships.y[slots], ships.vx[slots], ships.vy[slots] = state.T
+
+    def _coast(self, idx, perturbation, thrust_acc):
+        """
+        Kepler fast path: finds the ships in slots idx that apply no thrust and whose pull from other ships and
+        static bodies is below kepler_threshold, and moves them along their two-body orbit in closed form. The orbit's epoch state is
+        cached per ship until it thrusts or is perturbed again.
+        Args:
+            perturbation: Ship-to-ship plus static-body acceleration [len(idx), 2] at the start of the tick.
+        Returns: Boolean mask over idx of the ships that were advanced.
+        """
+        ships = self.ships
+        coasting = ~np.any(thrust_acc != 0.0, axis=1)
+        coasting &= np.sqrt(perturbation[:, 0]**2 + perturbation[:, 1]**2) < self.kepler_threshold
+        ships.kepler_valid[idx[~coasting]] = False
+
+        slots = idx[coasting]
+        new = slots[~ships.kepler_valid[slots]]
+        ships.epoch_x[new], ships.epoch_y[new] = ships.x[new], ships.y[new]
+        ships.epoch_vx[new], ships.epoch_vy[new] = ships.vx[new], ships.vy[new]
+        ships.epoch_t[new] = 0.0
+        ships.kepler_chi[new] = 0.0
+        ships.kepler_valid[new] = True
+
+        ships.epoch_t[slots] += self.dt
+        pos, vel, chi = kepler.propagate(
+            np.stack([ships.epoch_x[slots], ships.epoch_y[slots]], axis=1),
+            np.stack([ships.epoch_vx[slots], ships.epoch_vy[slots]], axis=1),
+            ships.epoch_t[slots], self.GM, chi=ships.kepler_chi[slots])
+        ships.x[slots], ships.y[slots] = pos.T
+        ships.vx[slots], ships.vy[slots] = vel.T
+        ships.kepler_chi[slots] = chi
+        return coasting
+
+    def predict_coasting(self, ship_ids, ticks):
+        """
+        Jumps ships ahead along their two-body orbits without integrating (exact for any number of ticks).
+        Args:
+            ship_ids: Ships to predict (iterable).
+            ticks: Number of steps of dt to look ahead (int).
+        Returns: Dict of {ship_id: (x, y, vx, vy)} assuming no thrust, no ship-to-ship and no static-body pull.
+        """
+        ship_ids = list(ship_ids)
+        slots = np.array([self.ships.index[sid] for sid in ship_ids], dtype=np.int64)
+        ships = self.ships
+        pos, vel, _ = kepler.propagate(
+            np.stack([ships.x[slots], ships.y[slots]], axis=1),
+            np.stack([ships.vx[slots], ships.vy[slots]], axis=1),
+            ticks * self.dt, self.GM)
+        return {sid: (*p, *v) for sid, p, v in zip(ship_ids, pos.tolist(), vel.tolist())}
+
+    SNAPSHOT_FORMAT = 1
+
+    def snapshot(self):
+        """
+        Captures the whole simulation state as bytes: every ShipStore column over the live slots, ship ids,
+        step counter, random generator state and the integrator / solver caches, so that restore() followed by
+        step() reproduces the original run exactly. Configuration (GM, dt, integrator, ...) is not included.
+        Returns: Snapshot (bytes).
+        """
+        ships = self.ships
+        n = len(ships.ids)
+        state = {
+            'format': self.SNAPSHOT_FORMAT,
+            'ids': list(ships.ids),
+            'columns': {name: getattr(ships, name)[:n] for name in (*ShipStore.FIELDS, *ShipStore.INTERNAL_FIELDS)},
+            'store_version': ships.version,
+            'current_step': self.current_step,
+            'rng': self.rng.bit_generator.state,
+            'grid_order': self._grid.order if self._grid is not None else None,
+            'verlet_cache': self._verlet_cache,
+            'dopri': self._dopri,
+            'dopri_key': self._dopri_key,
+            'drift_summary': self.drift_summary,
+        }
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, snapshot):
+        """
+        Returns the environment to the state captured by snapshot() (of an environment with the same
+        configuration). Snapshots are pickled, so only restore ones this program created.
+        """
+        state = pickle.loads(snapshot)
+        if state['format'] != self.SNAPSHOT_FORMAT:
+            raise ValueError(f"Snapshot format '{state['format']}' is not supported.")
+        ships = self.ships
+        ids = state['ids']
+        while ships.capacity < len(ids):
+            ships._grow()
+        for name, values in state['columns'].items():
+            getattr(ships, name)[:len(ids)] = values
+        ships.ids = list(ids)
+        ships.index = {ship_id: slot for slot, ship_id in enumerate(ids)}
+        ships.version = state['store_version']
+
+        self.current_step = state['current_step']
+        self.rng.bit_generator.state = state['rng']
+        self._grid = None
+        if state['grid_order'] is not None:
+            self._grid = NeighborGrid(ships.x[:len(ids)], ships.y[:len(ids)], self.GM * 0.1, cutoff=self.cutoff)
+            self._grid.order = state['grid_order']
+        self._verlet_cache = state['verlet_cache']
+        self._dopri = state['dopri']
+        self._dopri_key = state['dopri_key']
+        self.drift_summary = state['drift_summary']
 
     def get_states(self):
         """
-        Returns a dict of {ship_id: {'x':..., 'y':..., 'vx':..., 'vy':...}}
+        Returns a dict of {ship_id: {'x':..., 'y':..., 'vx':..., 'vy':..., 'r':..., 'energy':..., ...}},
+        including the orbital elements computed during the last tick (non-finite ones as None).
         """
-        return {sid: dict(s) for sid, s in self.ships.items()}
\ No newline at end of file
+        ships = self.ships
+        columns = {name: ships.column(name).tolist() for name in ShipStore.FIELDS}
+        for name in ShipStore.ELEMENT_FIELDS:
+            # inf / nan are not valid JSON
+            if not np.all(np.isfinite(ships.column(name))):
+                columns[name] = [v if np.isfinite(v) else None for v in columns[name]]
+        for name, names in ShipStore.ENUM_FIELDS.items():
+            columns[name] = [names[c] for c in columns[name]]
+        return {sid: {name: col[slot] for name, col in columns.items()}
+                for sid, slot in ships.index.items()}
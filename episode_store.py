@@ -0,0 +1,160 @@
+"""
+Append-only columnar storage for the episodes of one run.
+
+A store is a directory with one raw float64 file per field, holding the steps of all episodes back to back, and
+an index of (episode number, end offset) int64 pairs:
+    fields.txt       Field names, one per line.
+    <field>.f64      Steps of every episode, in append order.
+    index.i64        One (episode, end) pair per episode; its start is the previous pair's end.
+Columns are read through np.memmap, so loading an episode is an index lookup plus zero-copy slices, however many
+episodes the run has. Appends write the columns before the index entry, so a crash leaves at most unindexed
+trailing steps, which the next append overwrites.
+"""
+import os
+import numpy as np
+
+INDEX_FILE = 'index.i64'
+FIELDS_FILE = 'fields.txt'
+
+
+# EpisodeStore reads and appends the episodes of one store directory (see the module docstring).
+# Readers pick up episodes appended by another thread or process on their next lookup.
+class EpisodeStore:
+    def __init__(self, path, fields=None):
+        """
+        Args:
+            path: Store directory, created if needed (str).
+            fields: Field names (tuple of str). Required to create a store; if the store exists they must match it.
+        """
+        self.path = path
+        fields_path = os.path.join(path, FIELDS_FILE)
+        if os.path.exists(fields_path):
+            with open(fields_path) as f:
+                stored = tuple(f.read().split())
+            if fields is not None and tuple(fields) != stored:
+                raise ValueError(f"Episode store fields '{tuple(fields)}' do not match '{stored}' in {path}.")
+            fields = stored
+        elif fields is None:
+            raise ValueError(f"Episode store '{path}' does not exist and no fields were given.")
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(fields_path, 'w') as f:
+                f.write('\n'.join(fields) + '\n')
+        self.fields = tuple(fields)
+        self._index = np.zeros((0, 2), dtype=np.int64)  # (episode, end) per episode
+        self._rows = {}  # episode: row of its latest entry in the index
+        self._columns = {}  # field: memmap over the indexed steps
+        self._trimmed = False  # Unindexed trailing steps removed before the first append
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, FIELDS_FILE))
+
+    def _file(self, name):
+        return os.path.join(self.path, f'{name}.f64')
+
+    def _refresh(self):
+        """Rereads the index if it grew since the last lookup"""
+        index_path = os.path.join(self.path, INDEX_FILE)
+        size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        if size // 16 == len(self._index):
+            return
+        index = np.fromfile(index_path, dtype=np.int64, count=size // 16 * 2).reshape(-1, 2)
+        for row in range(len(self._index), len(index)):
+            self._rows[int(index[row, 0])] = row
+        self._index = index
+        self._columns = {}
+
+    @property
+    def steps(self):
+        """Steps stored over all episodes"""
+        self._refresh()
+        return int(self._index[-1, 1]) if len(self._index) else 0
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index)
+
+    def __contains__(self, episode):
+        self._refresh()
+        return episode in self._rows
+
+    def episodes(self):
+        """Episode numbers in append order (an episode appended twice is listed twice)"""
+        self._refresh()
+        return self._index[:, 0].copy()
+
+    def column(self, name):
+        """Read-only memmap of one field over all stored steps"""
+        self._refresh()
+        if name not in self.fields:
+            raise ValueError(f"Episode store field '{name}' is not registered.")
+        column = self._columns.get(name)
+        if column is None:
+            steps = self.steps
+            if steps == 0:
+                return np.zeros(0)
+            column = self._columns[name] = np.memmap(self._file(name), dtype=np.float64, mode='r', shape=(steps,))
+        return column
+
+    def load(self, episode):
+        """
+        Returns: Dict of {field: read-only view [steps]} of the latest episode stored under this number.
+        """
+        self._refresh()
+        row = self._rows.get(episode)
+        if row is None:
+            raise ValueError(f"Episode '{episode}' is not in the store {self.path}.")
+        start = int(self._index[row - 1, 1]) if row else 0
+        end = int(self._index[row, 1])
+        return {name: self.column(name)[start:end] for name in self.fields}
+
+    def append(self, columns, episode=None):
+        """
+        Adds an episode at the end of the store.
+        Args:
+            columns: Dict of {field: array [steps]} with every field of the store.
+            episode: Episode number (int). Defaults to the number of episodes stored so far.
+        Returns: The episode number.
+        """
+        self._refresh()
+        missing = set(self.fields) - set(columns)
+        if missing:
+            raise ValueError(f"Episode is missing the store fields '{sorted(missing)}'.")
+        if episode is None:
+            episode = len(self._index)
+        start = self.steps
+        if not self._trimmed:
+            for name in self.fields:
+                if os.path.exists(self._file(name)):
+                    os.truncate(self._file(name), start * 8)
+            self._trimmed = True
+
+        values = {name: np.ascontiguousarray(columns[name], dtype=np.float64).ravel() for name in self.fields}
+        steps = len(values[self.fields[0]])
+        for name in self.fields:
+            if len(values[name]) != steps:
+                raise ValueError(f"Episode field '{name}' has {len(values[name])} steps instead of {steps}.")
+
+        for name in self.fields:
+            with open(self._file(name), 'ab') as f:
+                values[name].tofile(f)
+        with open(os.path.join(self.path, INDEX_FILE), 'ab') as f:
+            np.array([episode, start + steps], dtype=np.int64).tofile(f)
+        return episode
+
+
+def import_npz(data_dir):
+    """
+    Copies the episode_N.npz files of an older run's data folder into an EpisodeStore in data_dir/episodes,
+    in episode order. The .npz files are left in place.
+    Returns: The EpisodeStore.
+    """
+    files = [f for f in os.listdir(data_dir) if f.startswith('episode_') and f.endswith('.npz')]
+    store = None
+    for episode in sorted(int(f.split('_')[1].split('.')[0]) for f in files):
+        with np.load(os.path.join(data_dir, f'episode_{episode}.npz')) as data:
+            if store is None:
+                store = EpisodeStore(os.path.join(data_dir, 'episodes'), tuple(data.files))
+            store.append(data, episode)
+    return store
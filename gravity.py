@@ -0,0 +1,276 @@
+"""
+Ship-to-ship gravity solvers used by MultiShipOrbitalEnvironment for the perturbation term.
+
+Every solver is built from a set of source positions (all ships have the same mass, given as GM)
+and shares the same small interface:
+    update(src_x, src_y): move the sources (called between RK stages in coupled mode).
+    acceleration(x, y, self_index): acceleration [len(x), 2] on targets at (x, y). self_index[i] is the
+                                    source that target i is (skipped as self-gravity), or -1.
+Pairs closer than `softening` are skipped, matching the original collision/overlap safety.
+"""
+import numpy as np
+
+
+# DirectSum evaluates every target-source pair with broadcasting: exact, O(N*M) time and memory.
+class DirectSum:
+    def __init__(self, src_x, src_y, gm, softening=1e-3, chunk_size=2048):
+        """
+        Args:
+            src_x, src_y: Source positions (arrays).
+            gm: Gravitational parameter of each source (float).
+            softening: Pairs closer than this are skipped (float).
+            chunk_size: Targets per broadcast block, bounds the temporary [chunk, M] arrays (int).
+        """
+        self.gm = gm
+        self.softening = softening
+        self.chunk_size = chunk_size
+        self.update(src_x, src_y)
+
+    def update(self, src_x, src_y):
+        self.src_x = np.asarray(src_x, dtype=np.float64)
+        self.src_y = np.asarray(src_y, dtype=np.float64)
+
+    def acceleration(self, x, y, self_index=None):
+        acc = np.zeros((len(x), 2))
+        for lo in range(0, len(x), self.chunk_size):
+            hi = min(lo + self.chunk_size, len(x))
+            dx = self.src_x[None, :] - x[lo:hi, None]
+            dy = self.src_y[None, :] - y[lo:hi, None]
+            odist = np.sqrt(dx**2 + dy**2)
+            if self_index is not None:
+                rows = np.flatnonzero(self_index[lo:hi] >= 0)
+                odist[rows, self_index[lo:hi][rows]] = 0.0  # Skip self-gravity
+            close = odist < self.softening
+            pull = self.gm / np.where(close, 1.0, odist)**3
+            pull[close] = 0.0
+            acc[lo:hi, 0] = (pull * dx).sum(axis=1)
+            acc[lo:hi, 1] = (pull * dy).sum(axis=1)
+        return acc
+
+
+def _spread_bits(v):
+    """Spreads the low 16 bits of v so that bit k moves to bit 2k (for Morton keys)"""
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def _expand_ranges(lo, hi):
+    """For ranges [lo_i, hi_i) returns (owner, value): owner[k] = i, value[k] runs over lo_i..hi_i-1"""
+    counts = hi - lo
+    owner = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, lo[owner] + offsets
+
+
+# BarnesHutTree is a linear quadtree: sources are sorted by Morton key, so every cell at every level is a
+# contiguous range of the sorted order. The build is O(N log N) NumPy work and the force walk runs level
+# by level over a frontier of (target, cell) pairs, opening a cell when size / distance >= theta.
+class BarnesHutTree:
+    MAX_DEPTH = 16  # Morton keys use 16 bits per axis
+
+    def __init__(self, src_x, src_y, gm, theta=0.5, softening=1e-3):
+        """
+        Args:
+            src_x, src_y: Source positions (arrays).
+            gm: Gravitational parameter of each source (float).
+            theta: Opening angle; 0 reproduces the direct sum, larger values are faster and coarser (float).
+            softening: Pairs closer than this are skipped (float).
+        """
+        self.gm = gm
+        self.theta = theta
+        self.softening = softening
+        self._build(np.asarray(src_x, dtype=np.float64), np.asarray(src_y, dtype=np.float64))
+
+    def _build(self, src_x, src_y):
+        n = len(src_x)
+        self.n = n
+        self.levels = []
+        if n == 0:
+            return
+
+        # Bounding square of the sources, quantized to a 2^16 grid per axis
+        lo_x, lo_y = src_x.min(), src_y.min()
+        self.size = max(src_x.max() - lo_x, src_y.max() - lo_y, 1e-9) * (1 + 1e-9)
+        scale = (1 << self.MAX_DEPTH) / self.size
+        ix = np.clip(((src_x - lo_x) * scale).astype(np.int64), 0, (1 << self.MAX_DEPTH) - 1)
+        iy = np.clip(((src_y - lo_y) * scale).astype(np.int64), 0, (1 << self.MAX_DEPTH) - 1)
+        keys = (_spread_bits(ix) << 1) | _spread_bits(iy)
+
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.order] = np.arange(n)
+
+        # One entry per level: cells are maximal runs of equal key prefixes
+        for depth in range(self.MAX_DEPTH + 1):
+            prefix = sorted_keys >> (2 * (self.MAX_DEPTH - depth))
+            start = np.flatnonzero(np.r_[True, prefix[1:] != prefix[:-1]])
+            end = np.r_[start[1:], n]
+            self.levels.append({'start': start, 'end': end, 'count': end - start})
+            if len(start) == n:  # Every cell holds a single ship
+                break
+
+        for parent, child in zip(self.levels[:-1], self.levels[1:]):
+            parent['child_lo'] = np.searchsorted(child['start'], parent['start'])
+            parent['child_hi'] = np.searchsorted(child['start'], parent['end'])
+
+        self.update(src_x, src_y)
+
+    def update(self, src_x, src_y):
+        """Refits the cell centres of mass to new source positions, keeping the tree topology"""
+        if self.n == 0:
+            return
+        self.src_x = np.asarray(src_x, dtype=np.float64)
+        self.src_y = np.asarray(src_y, dtype=np.float64)
+        sorted_x = self.src_x[self.order]
+        sorted_y = self.src_y[self.order]
+        for level in self.levels:
+            level['com_x'] = np.add.reduceat(sorted_x, level['start']) / level['count']
+            level['com_y'] = np.add.reduceat(sorted_y, level['start']) / level['count']
+
+    def acceleration(self, x, y, self_index=None):
+        m = len(x)
+        ax = np.zeros(m)
+        ay = np.zeros(m)
+        if self.n == 0 or m == 0:
+            return np.stack([ax, ay], axis=1)
+
+        self_rank = np.full(m, -1, dtype=np.int64)
+        if self_index is not None:
+            has_self = self_index >= 0
+            self_rank[has_self] = self.rank[self_index[has_self]]
+
+        targets = np.arange(m)
+        cells = np.zeros(m, dtype=np.int64)  # Everyone starts at the root
+        for depth, level in enumerate(self.levels):
+            if len(targets) == 0:
+                break
+            last_level = depth == len(self.levels) - 1
+            start, end, count = level['start'][cells], level['end'][cells], level['count'][cells]
+            dx = level['com_x'][cells] - x[targets]
+            dy = level['com_y'][cells] - y[targets]
+            dist = np.sqrt(dx**2 + dy**2)
+            rank = self_rank[targets]
+            contains_self = (rank >= start) & (rank < end)
+
+            # Single ships and far-away cells are summed as point masses
+            single = count == 1
+            far = ~contains_self & (self.size / (1 << depth) < self.theta * dist)
+            accept = (single & ~contains_self) | (far & ~single)
+            accept &= dist >= self.softening
+            pull = self.gm * count[accept] / dist[accept]**3
+            ax += np.bincount(targets[accept], weights=pull * dx[accept], minlength=m)
+            ay += np.bincount(targets[accept], weights=pull * dy[accept], minlength=m)
+
+            refine = ~single & ~far
+            if last_level:
+                # Ships sharing a finest cell: sum them one by one
+                owner, sorted_pos = _expand_ranges(start[refine], end[refine])
+                self._add_members(x, y, targets[refine][owner], sorted_pos, self_rank, ax, ay)
+                break
+            owner, cells = _expand_ranges(level['child_lo'][cells[refine]], level['child_hi'][cells[refine]])
+            targets = targets[refine][owner]
+
+        return np.stack([ax, ay], axis=1)
+
+    def _add_members(self, x, y, targets, sorted_pos, self_rank, ax, ay):
+        keep = sorted_pos != self_rank[targets]
+        targets, sources = targets[keep], self.order[sorted_pos[keep]]
+        dx = self.src_x[sources] - x[targets]
+        dy = self.src_y[sources] - y[targets]
+        dist = np.sqrt(dx**2 + dy**2)
+        keep = dist >= self.softening
+        pull = self.gm / dist[keep]**3
+        ax += np.bincount(targets[keep], weights=pull * dx[keep], minlength=len(ax))
+        ay += np.bincount(targets[keep], weights=pull * dy[keep], minlength=len(ay))
+
+
+# NeighborGrid is a uniform spatial hash with cells one cutoff wide: only sources within `cutoff` of a target
+# are summed, found among the 3x3 cells around it. The skipped far field is bounded per target by
+# (skipped sources) * gm / cutoff^2, stored in `error_bound` after every acceleration() call.
+# update() re-bins incrementally: sources are re-sorted starting from the previous order, which is already
+# sorted when no ship changed cell, so a typical tick costs O(N).
+class NeighborGrid:
+    def __init__(self, src_x, src_y, gm, cutoff=1.0, softening=1e-3):
+        """
+        Args:
+            src_x, src_y: Source positions (arrays).
+            gm: Gravitational parameter of each source (float).
+            cutoff: Interaction radius; also the grid cell size (float).
+            softening: Pairs closer than this are skipped (float).
+        """
+        self.gm = gm
+        self.cutoff = cutoff
+        self.softening = softening
+        self.order = None
+        self.error_bound = None
+        self.update(src_x, src_y)
+
+    def _cell_keys(self, x, y):
+        ix = np.clip(np.floor(x / self.cutoff), -2**30, 2**30).astype(np.int64)
+        iy = np.clip(np.floor(y / self.cutoff), -2**30, 2**30).astype(np.int64)
+        return ix, iy
+
+    @staticmethod
+    def _hash(ix, iy):
+        return (ix << 32) + iy
+
+    def update(self, src_x, src_y):
+        """Re-bins the sources, reusing the previous tick's cell order when the ship count is unchanged"""
+        self.src_x = np.asarray(src_x, dtype=np.float64)
+        self.src_y = np.asarray(src_y, dtype=np.float64)
+        keys = self._hash(*self._cell_keys(self.src_x, self.src_y))
+
+        if self.order is None or len(self.order) != len(keys):
+            self.order = np.argsort(keys, kind='stable')
+        else:
+            previous = keys[self.order]
+            if np.any(previous[1:] < previous[:-1]):  # Some ships changed cell
+                self.order = self.order[np.argsort(previous, kind='stable')]
+        sorted_keys = keys[self.order]
+
+        first = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+        self.cell_start = np.flatnonzero(first)
+        self.cell_end = np.r_[self.cell_start[1:], len(keys)]
+        self.cell_keys = sorted_keys[self.cell_start]
+
+    def acceleration(self, x, y, self_index=None):
+        m, n = len(x), len(self.src_x)
+        acc = np.zeros((m, 2))
+        self.error_bound = np.zeros(m)
+        if m == 0 or n == 0:
+            return acc
+
+        # Candidate (target, source) pairs from the 3x3 block of cells around each target
+        ix, iy = self._cell_keys(x, y)
+        offsets = np.array([-1, 0, 1])
+        nx = (ix[:, None, None] + offsets[None, :, None]).repeat(3, axis=2).ravel()
+        ny = (iy[:, None, None] + offsets[None, None, :]).repeat(3, axis=1).ravel()
+        query = self._hash(nx, ny)
+        slot = np.minimum(np.searchsorted(self.cell_keys, query), len(self.cell_keys) - 1)
+        found = self.cell_keys[slot] == query
+        lo = np.where(found, self.cell_start[slot], 0)
+        hi = np.where(found, self.cell_end[slot], 0)
+        owner, sorted_pos = _expand_ranges(lo, hi)
+        targets = owner // 9
+        sources = self.order[sorted_pos]
+
+        dx = self.src_x[sources] - x[targets]
+        dy = self.src_y[sources] - y[targets]
+        dist = np.sqrt(dx**2 + dy**2)
+        in_range = dist <= self.cutoff
+        if self_index is not None:
+            in_range &= sources != self_index[targets]
+        neighbors = np.bincount(targets[in_range], minlength=m)
+        keep = in_range & (dist >= self.softening)
+
+        pull = self.gm / dist[keep]**3
+        acc[:, 0] = np.bincount(targets[keep], weights=pull * dx[keep], minlength=m)
+        acc[:, 1] = np.bincount(targets[keep], weights=pull * dy[keep], minlength=m)
+
+        others = n - (self_index >= 0 if self_index is not None else 0)
+        self.error_bound = (others - neighbors) * self.gm / self.cutoff**2
+        return acc
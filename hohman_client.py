@@ -120,12 +120,20 @@ def choose_action():
 
     r = compute_radius(x,y)
     
-    # Radial Velocity
-    v_rad = (x*vx + y*vy) / r if r > 1e-5 else 0
+    # Radial Velocity (sent by the server; computed locally for older servers)
+    v_rad = cached_state.get("v_radial")
+    if v_rad is None:
+        v_rad = (x*vx + y*vy) / r if r > 1e-5 else 0
 
     # --- Telemetry Logging (Every ~1 second) ---
     if tick % 60 == 0:
-        E, a, e = calculate_orbital_elements(x, y, vx, vy)
+        if cached_state.get("energy") is not None:
+            E = cached_state["energy"]
+            a = cached_state["semi_major_axis"]
+            a = float('inf') if a is None else a  # Parabolic
+            e = cached_state["eccentricity"]
+        else:
+            E, a, e = calculate_orbital_elements(x, y, vx, vy)
         print(f"[DEBUG T={tick}] r={r:.4f}, v_rad={v_rad:.4f}, Energy={E:.4f}, a={a:.4f}, e={e:.4f}")
 
     # --- Phase 1: Injection Burn (Start Transfer) ---
@@ -258,7 +266,12 @@ async def main():
                             "y": s["y"],
                             "vx": s["vx"],
                             "vy": s["vy"],
-                            "heading": s.get("heading", 0.0)
+                            "heading": s.get("heading", 0.0),
+                            # Orbital elements computed by the server this tick (None if not sent)
+                            "energy": s.get("energy"),
+                            "semi_major_axis": s.get("semi_major_axis"),
+                            "eccentricity": s.get("eccentricity"),
+                            "v_radial": s.get("v_radial"),
                         }
 
                 elif t == "action_request":
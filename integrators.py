@@ -0,0 +1,170 @@
+"""
+Integrators shared by OrbitalEnvironment and MultiShipOrbitalEnvironment.
+
+States are [N, 4] arrays of (x, y, vx, vy). RK4 and Dormand-Prince take the full derivative(state) -> [N, 4];
+the symplectic schemes only need acceleration(positions [N, 2]) -> [N, 2], i.e. forces that do not
+depend on velocity (thrust is held constant over the step, so it qualifies).
+"""
+import numpy as np
+
+INTEGRATORS = ('rk4', 'verlet', 'yoshida4', 'dopri5')
+
+# Force evaluations per step for the fixed-step schemes (velocity Verlet reuses the previous step's
+# final acceleration). DormandPrince counts its own in `evaluations`.
+FORCE_EVALUATIONS = {'rk4': 4, 'verlet': 1, 'yoshida4': 3}
+
+# Yoshida (1990) 4th-order coefficients: three Verlet-like substeps of w1, w0, w1
+_CBRT2 = 2.0 ** (1.0 / 3.0)
+_W1 = 1.0 / (2.0 - _CBRT2)
+_W0 = -_CBRT2 / (2.0 - _CBRT2)
+YOSHIDA_DRIFT = (_W1 / 2, (_W0 + _W1) / 2, (_W0 + _W1) / 2, _W1 / 2)
+YOSHIDA_KICK = (_W1, _W0, _W1)
+
+
+def rk4_step(state, derivative, dt):
+    """Classic Runge-Kutta 4: returns the state after dt"""
+    k1 = derivative(state)
+    k2 = derivative(state + 0.5 * dt * k1)
+    k3 = derivative(state + 0.5 * dt * k2)
+    k4 = derivative(state + dt * k3)
+    return state + dt * (k1 + 2*k2 + 2*k3 + k4) / 6.0
+
+
+def verlet_step(state, acceleration, dt, acc=None):
+    """
+    Velocity Verlet (kick-drift-kick), 2nd order and symplectic.
+    Args:
+        acc: Acceleration at the current positions if already known (e.g. from the previous step).
+    Returns: Tuple of (new state, acceleration at the new positions) so the caller can reuse it.
+    """
+    pos, vel = state[:, :2], state[:, 2:]
+    if acc is None:
+        acc = acceleration(pos)
+    vel = vel + 0.5 * dt * acc
+    pos = pos + dt * vel
+    new_acc = acceleration(pos)
+    vel = vel + 0.5 * dt * new_acc
+    return np.concatenate([pos, vel], axis=1), new_acc
+
+
+def yoshida4_step(state, acceleration, dt):
+    """Yoshida 4th-order symplectic integrator (drift-kick form, three force evaluations)"""
+    pos, vel = state[:, :2], state[:, 2:]
+    for drift, kick in zip(YOSHIDA_DRIFT, YOSHIDA_KICK):
+        pos = pos + drift * dt * vel
+        vel = vel + kick * dt * acceleration(pos)
+    pos = pos + YOSHIDA_DRIFT[-1] * dt * vel
+    return np.concatenate([pos, vel], axis=1)
+
+
+# Dormand-Prince 5(4) tableau (Dormand & Prince 1980) with Hairer's 4th-order dense output coefficients
+_DP_A = (
+    (),
+    (1/5,),
+    (3/40, 9/40),
+    (44/45, -56/15, 32/9),
+    (19372/6561, -25360/2187, 64448/6561, -212/729),
+    (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+    (35/384, 0.0, 500/1113, 125/192, -2187/6784, 11/84),
+)
+_DP_E = (71/57600, 0.0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+_DP_D = (-12715105075/11282082432, 0.0, 87487479700/32700410799, -10690763975/1880347072,
+         701980252875/199316789632, -1453857185/822651844, 69997945/29380423)
+
+
+# DormandPrince is an embedded RK5(4) integrator with error-controlled substeps inside each fixed external tick.
+# Substeps are not clipped to the tick boundary: the last one may run past it and the tick-end state is read
+# from the dense output. If the next tick has the same right-hand side (`continuing=True`), integration carries
+# on from the internal state, so a coasting orbit takes steps as long as the tolerance allows, not one per tick.
+class DormandPrince:
+    def __init__(self, rtol=1e-8, atol=1e-10, max_step=np.inf, min_step=1e-4):
+        """
+        Args:
+            rtol, atol: Relative and absolute tolerance on every state component (float).
+            max_step: Largest substep allowed (float).
+            min_step: Smallest substep; a step this small is accepted even above tolerance, which bounds the
+                      work per tick during near-collisions (float).
+        """
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.min_step = min_step
+        self.h = None           # Step size proposal, kept across ticks and restarts
+        self.evaluations = 0    # Derivative evaluations so far
+        self.substeps = 0       # Accepted substeps so far
+        self.forced_steps = 0   # Substeps accepted at min_step despite exceeding the tolerance
+        self.reset()
+
+    def reset(self):
+        """Forgets the internal state; the next advance() starts from the state it is given"""
+        self._t = 0.0       # Internal time, relative to the start of the current tick
+        self._y = None      # Internal state at _t (may be ahead of the tick boundary)
+        self._f = None      # derivative(_y), reused as the first stage (FSAL)
+        self._dense = None  # (t0, h, coefficients) of the last accepted substep
+
+    def advance(self, state, derivative, dt, continuing=False):
+        """
+        Integrates from the current tick start to dt later.
+        Args:
+            state: State at the tick start; ignored when continuing from the internal state.
+            derivative: Right-hand side for this tick.
+            dt: Tick length (float).
+            continuing: True if the right-hand side is the same as on the previous tick and the state was
+                        not modified since it was returned (bool).
+        Returns: State at the end of the tick.
+        """
+        if not continuing or self._y is None:
+            self.reset()
+            self._y = np.array(state, dtype=np.float64)
+            self._f = derivative(self._y)
+            self.evaluations += 1
+        if self.h is None:
+            self.h = dt
+
+        while self._t < dt:
+            self._substep(derivative)
+
+        t0, h, coeffs = self._dense
+        result = self._interpolate((dt - t0) / h, coeffs)
+
+        # Re-base internal times on the next tick start
+        self._t -= dt
+        self._dense = (t0 - dt, h, coeffs)
+        return result
+
+    def _substep(self, derivative):
+        y, f = self._y, self._f
+        while True:
+            h = min(max(self.h, self.min_step), self.max_step)
+            k = [f]
+            for row in _DP_A[1:]:
+                stage = y + h * sum(a * ki for a, ki in zip(row, k) if a != 0.0)
+                k.append(derivative(stage))
+            self.evaluations += 6
+            y_new = stage  # The last row is the 5th-order solution (FSAL)
+
+            err = h * sum(e * ki for e, ki in zip(_DP_E, k) if e != 0.0)
+            scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+            err_norm = np.sqrt(np.mean((err / scale)**2))
+            factor = 0.9 * max(err_norm, 1e-10) ** -0.2
+            self.h = h * min(max(factor, 0.2), 5.0)
+            if err_norm <= 1.0:
+                break
+            if h <= self.min_step:
+                self.forced_steps += 1
+                break
+
+        ydiff = y_new - y
+        bspl = h * k[0] - ydiff
+        coeffs = (y, ydiff, bspl, ydiff - h * k[6] - bspl,
+                  h * sum(d * ki for d, ki in zip(_DP_D, k) if d != 0.0))
+        self._dense = (self._t, h, coeffs)
+        self._t += h
+        self._y, self._f = y_new, k[6]
+        self.substeps += 1
+
+    @staticmethod
+    def _interpolate(theta, coeffs):
+        r1, r2, r3, r4, r5 = coeffs
+        theta1 = 1.0 - theta
+        return r1 + theta * (r2 + theta1 * (r3 + theta * (r4 + theta1 * r5)))
@@ -0,0 +1,140 @@
+"""
+Vectorized two-body propagation with the universal variable formulation (Vallado, Algorithm 8).
+Works for elliptic, parabolic and hyperbolic orbits alike, on arrays of N ships at once.
+"""
+import numpy as np
+
+
+def stumpff(psi):
+    """Stumpff functions C(psi), S(psi), with a series near psi = 0"""
+    psi = np.asarray(psi, dtype=np.float64)
+    c = np.empty_like(psi)
+    s = np.empty_like(psi)
+
+    small = np.abs(psi) < 1e-2
+    p = psi[small]
+    c[small] = 1/2 - p/24 + p**2/720 - p**3/40320
+    s[small] = 1/6 - p/120 + p**2/5040 - p**3/362880
+
+    pos = psi >= 1e-2
+    sq = np.sqrt(psi[pos])
+    c[pos] = (1 - np.cos(sq)) / psi[pos]
+    s[pos] = (sq - np.sin(sq)) / sq**3
+
+    neg = psi <= -1e-2
+    sq = np.sqrt(-psi[neg])
+    c[neg] = (np.cosh(sq) - 1) / -psi[neg]
+    s[neg] = (np.sinh(sq) - sq) / sq**3
+    return c, s
+
+
+def orbital_period(r0, v0, mu):
+    """Period [N] of the orbits through states (r0, v0), inf for unbound ones"""
+    alpha = 2 / np.linalg.norm(r0, axis=1) - np.sum(v0**2, axis=1) / mu
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(alpha > 0, 2 * np.pi / (np.sqrt(mu) * np.abs(alpha)**1.5), np.inf)
+
+
+def propagate(r0, v0, dt, mu, chi=None, tol=1e-12, max_iter=50):
+    """
+    Propagates states exactly along their two-body orbits.
+    Args:
+        r0, v0: Epoch positions and velocities [N, 2].
+        dt: Time since epoch, scalar or [N].
+        mu: Gravitational parameter of the central body (float).
+        chi: Optional warm start for the universal anomaly [N], e.g. the previous tick's solution.
+        tol: Newton convergence tolerance on chi (float).
+        max_iter: Newton iteration cap (int).
+    Returns:
+        Tuple of (positions [N, 2], velocities [N, 2], chi [N]).
+    """
+    sqrt_mu = np.sqrt(mu)
+    r0_norm = np.linalg.norm(r0, axis=1)
+    rv = np.sum(r0 * v0, axis=1) / sqrt_mu
+    alpha = 2 / r0_norm - np.sum(v0**2, axis=1) / mu
+    dt = np.broadcast_to(np.asarray(dt, dtype=np.float64), r0_norm.shape)
+
+    # Whole revolutions of bound orbits change nothing, so only the remainder is solved for
+    period = orbital_period(r0, v0, mu)
+    bound = np.isfinite(period)
+    dt = np.where(bound, np.fmod(dt, period), dt)
+
+    guess = np.where(bound, sqrt_mu * alpha * dt, sqrt_mu * dt / r0_norm)
+    if chi is None:
+        chi = guess
+    else:
+        # Shift warm starts by whole revolutions (2 pi / sqrt(alpha) in chi) to match the wrapped dt
+        chi = np.array(chi, dtype=np.float64)
+        chi_period = 2 * np.pi / np.sqrt(alpha[bound])
+        chi[bound] -= np.round((chi[bound] - guess[bound]) / chi_period) * chi_period
+
+    for _ in range(max_iter):
+        psi = alpha * chi**2
+        c, s = stumpff(psi)
+        r = chi**2 * c + rv * chi * (1 - psi * s) + r0_norm * (1 - psi * c)
+        f_chi = rv * chi**2 * c + (1 - alpha * r0_norm) * chi**3 * s + r0_norm * chi - sqrt_mu * dt
+        delta = f_chi / r
+        chi = chi - delta
+        if np.all(np.abs(delta) < tol):
+            break
+
+    psi = alpha * chi**2
+    c, s = stumpff(psi)
+    f = 1 - chi**2 / r0_norm * c
+    g = dt - chi**3 / sqrt_mu * s
+    pos = f[:, None] * r0 + g[:, None] * v0
+    r = np.linalg.norm(pos, axis=1)
+    f_dot = sqrt_mu / (r * r0_norm) * chi * (psi * s - 1)
+    g_dot = 1 - chi**2 / r * c
+    vel = f_dot[:, None] * r0 + g_dot[:, None] * v0
+    return pos, vel, chi
+
+
+def elements(x, y, vx, vy, mu):
+    """
+    Radius, radial and tangential speed, specific energy, angular momentum, semi-major axis and eccentricity
+    of the states (x, y, vx, vy) [N], in one pass.
+    Returns: Dict of arrays [N]. The semi-major axis is inf for parabolic and negative for hyperbolic orbits.
+    """
+    r = np.maximum(np.sqrt(x**2 + y**2), 1e-5)
+    h = x * vy - y * vx
+    energy = 0.5 * (vx**2 + vy**2) - mu / r
+    safe = np.where(energy != 0.0, energy, 1.0)
+    a = np.where(energy != 0.0, -mu / (2 * safe), np.inf)
+    return {
+        'r': r,
+        'v_radial': (x * vx + y * vy) / r,
+        'v_tangential': h / r,
+        'energy': energy,
+        'angular_momentum': h,
+        'semi_major_axis': a,
+        'eccentricity': np.sqrt(np.maximum(1 + 2 * energy * h**2 / mu**2, 0.0)),
+    }
+
+
+def solve_kepler(mean_anomaly, e, tol=1e-12, max_iter=50):
+    """
+    Eccentric anomaly E with E - e sin(E) = M, by Newton iterations over the whole batch at once.
+    Args:
+        mean_anomaly: Mean anomalies M, scalar or [N].
+        e: Eccentricities in (-1, 1), scalar or [N]. A negative e measures E from apoapsis instead of periapsis,
+           so r = a (1 - e cos E) starts at a (1 - e) either way.
+        tol: Newton convergence tolerance on E (float).
+        max_iter: Newton iteration cap (int).
+    Returns: Eccentric anomalies, shaped like the broadcast inputs.
+    """
+    M, e = np.broadcast_arrays(np.asarray(mean_anomaly, dtype=np.float64), np.asarray(e, dtype=np.float64))
+    # Solve for e >= 0 (shifting E and M by pi flips the sign of e) with M reduced to [-pi, pi]
+    flip = e < 0
+    M = np.where(flip, M + np.pi, M)
+    e = np.abs(e)
+    turns = np.round(M / (2 * np.pi)) * 2 * np.pi
+    M = M - turns
+
+    E = M + 0.85 * e * np.sign(M)  # Danby's starting value, convergent for any e < 1
+    for _ in range(max_iter):
+        delta = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E = E - delta
+        if np.all(np.abs(delta) < tol):
+            break
+    return E + turns - np.where(flip, np.pi, 0.0)
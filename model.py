@@ -1,83 +1,361 @@
+import warnings
 import gym
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.nn.functional as F
+import numpy as np
+import stable_baselines3
 from stable_baselines3 import PPO
+from stable_baselines3.common.utils import explained_variance
 from stable_baselines3.common.policies import ActorCriticPolicy
 from itertools import chain
+from vec_env import VecOrbitalEnv
+
+try:
+    from gymnasium import spaces  # Stable-Baselines3 >= 2.0 expects Gymnasium spaces
+except ImportError:
+    from gym import spaces
+
+def _dot(a, b):
+    """Dot product of two parameter lists (lists of tensors) as a float"""
+    return float(sum((x * y).sum() for x, y in zip(a, b)))
 
 # Custom NewtonOptimizer class
 class NewtonOptimizer(optim.Optimizer):
     """
     Implements a simplified version of Newton's Method for deep learning.
-    Computes parameter updates using the inverse of the Hessian matrix.
+    Computes parameter updates u from the damped Newton system (H + damping * I) u = grad, in one of three modes:
+        'dense': Builds the Hessian of each parameter tensor row by row and inverts it. O(P^2) memory and
+                 O(P^3) time per tensor, so only for small tensors.
+        'cg': Hessian-free. Solves the system for all parameters of a group with conjugate gradient, using
+              Hessian-vector products (one double-backward pass each) instead of the Hessian.
+        'diagonal': Divides the gradient by a running Hutchinson estimate of |diag(H)|, one Hessian-vector
+                    product per step.
+    The curvature comes from the gradient's graph, so the gradients must be computed with
+    loss.backward(create_graph=True), either before step() or in the closure.
     """
-    def __init__(self, params, lr=1.0, damping=1e-4):
+    MODES = ('dense', 'cg', 'diagonal')
+
+    def __init__(self, params, lr=1.0, damping=1e-4, mode='dense', cg_iters=10, cg_tol=1e-10,
+                 adapt_damping=False, diagonal_decay=0.95):
         """
         Args:
             params: Iterable of model parameters to optimize.
             lr: Learning rate for the parameter updates.
             damping: Damping factor for stabilizing the Hessian inversion.
+            mode: 'dense', 'cg' or 'diagonal', see above.
+            cg_iters: Cap on conjugate gradient iterations (Hessian-vector products) per step in 'cg' mode.
+            cg_tol: Conjugate gradient stops once the squared residual norm is below this.
+            adapt_damping: Trust-region (Levenberg-Marquardt) damping. When step() gets a closure, the loss is
+                           re-evaluated after the update and the damping is raised by 3/2 if the loss fell by less
+                           than a quarter of what the quadratic model predicted, lowered by 2/3 if by more than
+                           three quarters.
+            diagonal_decay: Decay of the running diagonal estimate in 'diagonal' mode.
         """
-        defaults = {'lr': lr, 'damping': damping}
+        if mode not in self.MODES:
+            raise ValueError(f"Newton mode '{mode}' is not registered.")
+        defaults = {'lr': lr, 'damping': damping, 'mode': mode, 'cg_iters': cg_iters, 'cg_tol': cg_tol,
+                    'adapt_damping': adapt_damping, 'diagonal_decay': diagonal_decay}
         super(NewtonOptimizer, self).__init__(params, defaults)
+        self.reduction_ratio = None  # Actual over predicted loss reduction of the last adapted step
 
     def step(self, closure=None):
         """
         Performs a single optimization step.
         Args:
-            closure: A closure that re-evaluates the model and returns the loss.
+            closure: A closure that re-evaluates the model and returns the loss, calling
+                     loss.backward(create_graph=True). Required for adapt_damping.
         """
         loss = None
         if closure is not None:
-            loss = closure()
+            with torch.enable_grad():
+                loss = closure()
 
+        predicted = 0.0  # Loss reduction predicted by the quadratic model, for adapt_damping
+        updates = []
         for group in self.param_groups:
-            for p in group['params']:
-                if p.grad is None:
-                    continue
-                
-                grad = p.grad
-                if grad.is_sparse:
-                    raise RuntimeError('NewtonOptimizer does not support sparse gradients.')
+            params = [p for p in group['params'] if p.grad is not None]
+            if not params:
+                continue
+            grads = [p.grad for p in params]
+            if any(grad.is_sparse for grad in grads):
+                raise RuntimeError('NewtonOptimizer does not support sparse gradients.')
+            if not any(grad.requires_grad for grad in grads):
+                raise RuntimeError('NewtonOptimizer needs gradients from loss.backward(create_graph=True).')
 
-                hessian = self._compute_hessian(grad, p)
-                hessian_inv = torch.linalg.pinv(hessian + group['damping'] * torch.eye(hessian.size(0)))
+            damping = group['damping']
+            if group['mode'] == 'dense':
+                directions = [self._dense_direction(grad, p, damping) for grad, p in zip(grads, params)]
+            elif group['mode'] == 'cg':
+                directions = self._conjugate_gradient(lambda vectors: self._hvp(grads, params, vectors),
+                                                      [grad.detach() for grad in grads], damping,
+                                                      group['cg_iters'], group['cg_tol'])
+            else:
+                directions = self._diagonal_direction(grads, params, damping, group['diagonal_decay'])
 
-                update = hessian_inv @ grad.view(-1)
-                p.data.add_(-group['lr'] * update.view(p.size()))
+            if group['adapt_damping'] and closure is not None:
+                lr = group['lr']
+                curvature = self._hvp(grads, params, directions)
+                predicted += lr * _dot([grad.detach() for grad in grads], directions) - 0.5 * lr**2 * _dot(directions, curvature)
+            updates.append((group['lr'], params, directions))
 
+        for lr, params, directions in updates:
+            for p, direction in zip(params, directions):
+                p.data.add_(-lr * direction)
+
+        if predicted > 0:
+            with torch.enable_grad():
+                new_loss = closure()
+            self._adapt_damping((float(loss.detach()) - float(new_loss.detach())) / predicted)
         return loss
 
+    def _adapt_damping(self, ratio):
+        self.reduction_ratio = ratio
+        for group in self.param_groups:
+            if group['adapt_damping']:
+                if ratio < 0.25:
+                    group['damping'] *= 1.5
+                elif ratio > 0.75:
+                    group['damping'] *= 2 / 3
+
+    @staticmethod
+    def _hvp(grads, params, vectors):
+        """
+        Hessian-vector products H v for one group, from its gradients (with graph) and vectors shaped like params.
+        """
+        pairs = [(grad, v) for grad, v in zip(grads, vectors) if grad.requires_grad]
+        products = torch.autograd.grad([grad for grad, _ in pairs], params, grad_outputs=[v for _, v in pairs],
+                                       retain_graph=True, allow_unused=True)
+        return [torch.zeros_like(p) if h is None else h for h, p in zip(products, params)]
+
+    def _conjugate_gradient(self, hvp, b, damping, iters, tol):
+        """
+        Approximately solves (H + damping * I) x = b with at most `iters` Hessian-vector products.
+        Stops early at a direction of negative curvature; if that is the first one, returns b (a gradient step).
+        """
+        x = [torch.zeros_like(t) for t in b]
+        r = [t.clone() for t in b]
+        d = [t.clone() for t in b]
+        rs = _dot(r, r)
+        for i in range(iters):
+            if rs < tol:
+                break
+            hd = [h + damping * t for h, t in zip(hvp(d), d)]
+            curvature = _dot(d, hd)
+            if curvature <= 0:
+                return b if i == 0 else x
+            alpha = rs / curvature
+            x = [xi + alpha * di for xi, di in zip(x, d)]
+            r = [ri - alpha * hi for ri, hi in zip(r, hd)]
+            rs_new = _dot(r, r)
+            d = [ri + (rs_new / rs) * di for ri, di in zip(r, d)]
+            rs = rs_new
+        return x
+
+    def _dense_direction(self, grad, param, damping):
+        hessian = self._compute_hessian(grad, param)
+        eye = torch.eye(hessian.size(0), dtype=hessian.dtype, device=hessian.device)
+        hessian_inv = torch.linalg.pinv(hessian + damping * eye)
+        return (hessian_inv @ grad.detach().view(-1)).view(param.size())
+
     def _compute_hessian(self, grad, param):
         """
-        Computes the Hessian matrix for the given gradient.
+        Computes the Hessian matrix of the given parameter from its gradient (with graph), one row per element.
         """
-        grad2rd = torch.autograd.grad(grad.sum(), param, create_graph=True)[0]
+        if not grad.requires_grad:
+            return torch.zeros(param.numel(), param.numel(), dtype=param.dtype, device=param.device)
         hessian = []
-        for g2 in grad2rd.view(-1):
-            h_row = torch.autograd.grad(g2, param, retain_graph=True)[0].view(-1)
-            hessian.append(h_row)
+        for g in grad.view(-1):
+            h_row = torch.autograd.grad(g, param, retain_graph=True, allow_unused=True)[0]
+            hessian.append(torch.zeros_like(param).view(-1) if h_row is None else h_row.view(-1))
         return torch.stack(hessian)
 
-# Custom policy class that uses NewtonOptimizer as the optimizer
+    def _diagonal_direction(self, grads, params, damping, decay):
+        """Gradient divided by a running Hutchinson estimate E[|z * Hz|] of |diag(H)|, z random signs"""
+        probes = [torch.randint_like(p, 2) * 2 - 1 for p in params]
+        directions = []
+        for p, grad, z, hz in zip(params, grads, probes, self._hvp(grads, params, probes)):
+            estimate = (z * hz).abs()
+            state = self.state[p]
+            if 'hessian_diag' in state:
+                state['hessian_diag'].mul_(decay).add_(estimate, alpha=1 - decay)
+            else:
+                state['hessian_diag'] = estimate
+            directions.append(grad.detach() / (state['hessian_diag'] + damping))
+        return directions
+
+# Custom policy class, trained with Adam or, with optimizer_class=NewtonOptimizer, NewtonOptimizer (see create_model)
 class CustomActorCriticPolicy(ActorCriticPolicy):
     def __init__(self, *args, **kwargs):
         super(CustomActorCriticPolicy, self).__init__(*args, **kwargs)
-    def _make_optimizers(self):
-        self.optimizer = NewtonOptimizer(self.parameters(), lr=self.learning_rate, damping=1e-4)
 
-def create_model(env):
+# NewtonPPO is PPO whose update keeps the gradients' graph (loss.backward(create_graph=True)), which the
+# curvature of NewtonOptimizer is computed from. train() is a copy of PPO.train from Stable-Baselines3
+# SB3_VERSION (pinned in requirements.txt) with two changes: the create_graph backward, and gradient clipping
+# applied as a smaller learning rate for the step, since rescaling the gradients in place would leave the
+# curvature computed from the unclipped graph. Other SB3 versions get a warning, as their PPO.train may differ.
+SB3_VERSION = '2.9.0'
+
+class NewtonPPO(PPO):
+    def __init__(self, *args, **kwargs):
+        if stable_baselines3.__version__ != SB3_VERSION:
+            warnings.warn(f"NewtonPPO.train is copied from Stable-Baselines3 {SB3_VERSION}, but "
+                          f"{stable_baselines3.__version__} is installed; its PPO.train may have changed.")
+        super(NewtonPPO, self).__init__(*args, **kwargs)
+
+    def train(self):
+        """
+        Update policy using the currently gathered rollout buffer.
+        """
+        # Switch to train mode (this affects batch norm / dropout)
+        self.policy.set_training_mode(True)
+        # Update optimizer learning rate
+        self._update_learning_rate(self.policy.optimizer)
+        # Compute current clip range
+        clip_range = self.clip_range(self._current_progress_remaining)
+        # Optional: clip range for the value function
+        if self.clip_range_vf is not None:
+            clip_range_vf = self.clip_range_vf(self._current_progress_remaining)
+
+        entropy_losses = []
+        pg_losses, value_losses = [], []
+        clip_fractions = []
+
+        continue_training = True
+        # train for n_epochs epochs
+        for epoch in range(self.n_epochs):
+            approx_kl_divs = []
+            # Do a complete pass on the rollout buffer
+            for rollout_data in self.rollout_buffer.get(self.batch_size):
+                actions = rollout_data.actions
+                if isinstance(self.action_space, spaces.Discrete):
+                    # Convert discrete action from float to long
+                    actions = rollout_data.actions.long().flatten()
+
+                values, log_prob, entropy = self.policy.evaluate_actions(rollout_data.observations, actions)
+                values = values.flatten()
+                # Normalize advantage
+                advantages = rollout_data.advantages
+                if self.normalize_advantage and len(advantages) > 1:
+                    advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+
+                # ratio between old and new policy, should be one at the first iteration
+                ratio = torch.exp(log_prob - rollout_data.old_log_prob)
+
+                # clipped surrogate loss
+                policy_loss_1 = advantages * ratio
+                policy_loss_2 = advantages * torch.clamp(ratio, 1 - clip_range, 1 + clip_range)
+                policy_loss = -torch.min(policy_loss_1, policy_loss_2).mean()
+
+                # Logging
+                pg_losses.append(policy_loss.item())
+                clip_fraction = torch.mean((torch.abs(ratio - 1) > clip_range).float()).item()
+                clip_fractions.append(clip_fraction)
+
+                if self.clip_range_vf is None:
+                    # No clipping
+                    values_pred = values
+                else:
+                    # Clip the difference between old and new value
+                    values_pred = rollout_data.old_values + torch.clamp(
+                        values - rollout_data.old_values, -clip_range_vf, clip_range_vf
+                    )
+                # Value loss using the TD(gae_lambda) target
+                value_loss = F.mse_loss(rollout_data.returns, values_pred)
+                value_losses.append(value_loss.item())
+
+                # Entropy loss favor exploration
+                if entropy is None:
+                    # Approximate entropy when no analytical form
+                    entropy_loss = -torch.mean(-log_prob)
+                else:
+                    entropy_loss = -torch.mean(entropy)
+
+                entropy_losses.append(entropy_loss.item())
+
+                loss = policy_loss + self.ent_coef * entropy_loss + self.vf_coef * value_loss
+
+                # Approximate reverse KL divergence for early stopping
+                with torch.no_grad():
+                    log_ratio = log_prob - rollout_data.old_log_prob
+                    approx_kl_div = torch.mean((torch.exp(log_ratio) - 1) - log_ratio).cpu().numpy()
+                    approx_kl_divs.append(approx_kl_div)
+
+                if self.target_kl is not None and approx_kl_div > 1.5 * self.target_kl:
+                    continue_training = False
+                    if self.verbose >= 1:
+                        print(f"Early stopping at step {epoch} due to reaching max kl: {approx_kl_div:.2f}")
+                    break
+
+                # Optimization step, keeping the gradients' graph for the Hessian-vector products
+                self.policy.optimizer.zero_grad()
+                with warnings.catch_warnings():
+                    # The parameter-gradient reference cycle it warns about is broken by zero_grad below
+                    warnings.filterwarnings('ignore', message='Using backward\\(\\) with create_graph=True')
+                    loss.backward(create_graph=True)
+                # Clip grad norm by scaling the Newton step, which is linear in the gradient
+                with torch.no_grad():
+                    grad_norm = torch.linalg.vector_norm(torch.stack(
+                        [torch.linalg.vector_norm(p.grad) for p in self.policy.parameters() if p.grad is not None]))
+                clip_coef = min(1.0, self.max_grad_norm / (float(grad_norm) + 1e-6))
+                lrs = [group['lr'] for group in self.policy.optimizer.param_groups]
+                for group, lr in zip(self.policy.optimizer.param_groups, lrs):
+                    group['lr'] = lr * clip_coef
+                self.policy.optimizer.step()
+                for group, lr in zip(self.policy.optimizer.param_groups, lrs):
+                    group['lr'] = lr
+                # Drop the graphs held by the gradients before the next minibatch
+                self.policy.optimizer.zero_grad(set_to_none=True)
+
+            self._n_updates += 1
+            if not continue_training:
+                break
+
+        explained_var = explained_variance(self.rollout_buffer.values.flatten(), self.rollout_buffer.returns.flatten())
+
+        # Logs
+        self.logger.record("train/entropy_loss", np.mean(entropy_losses))
+        self.logger.record("train/policy_gradient_loss", np.mean(pg_losses))
+        self.logger.record("train/value_loss", np.mean(value_losses))
+        self.logger.record("train/approx_kl", np.mean(approx_kl_divs))
+        self.logger.record("train/clip_fraction", np.mean(clip_fractions))
+        self.logger.record("train/loss", loss.item())
+        self.logger.record("train/explained_variance", explained_var)
+        if hasattr(self.policy, "log_std"):
+            self.logger.record("train/std", torch.exp(self.policy.log_std).mean().item())
+
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/clip_range", clip_range)
+        if self.clip_range_vf is not None:
+            self.logger.record("train/clip_range_vf", clip_range_vf)
+
+OPTIMIZERS = ('adam', 'newton')  # Policy optimizers of create_model
+
+def create_model(env=None, reward='hohmann', optimizer='adam'):
     """
     Initializes an untrained PPO model with the default feature extractor.
+    Args:
+        env: Training environment (gym.Env or VecEnv). If None, a VecOrbitalEnv with the given reward is created.
+        reward: Name of the training reward in rewards.py, used when env is None (str).
+        optimizer: 'adam' (Stable-Baselines3's default), or 'newton' for Hessian-free Newton steps with
+                   NewtonOptimizer in 'cg' mode through NewtonPPO (str).
     """
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"Optimizer '{optimizer}' is not registered.")
+    if env is None:
+        env = VecOrbitalEnv(reward=reward)
     policy_kwargs = dict(
         net_arch=[dict(pi=[32, 32, 32, 32, 32, 32],    # Actor network (abritrary deep architecture)
                        vf=[32, 32, 32, 32, 32, 32])],  # Critic network (abritrary deep architecture)
         activation_fn=nn.ReLU,
     )
+    algorithm = PPO
+    if optimizer == 'newton':
+        policy_kwargs.update(optimizer_class=NewtonOptimizer, optimizer_kwargs={'mode': 'cg'})
+        algorithm = NewtonPPO
 
-    return PPO(CustomActorCriticPolicy, # Architecture type w Newton optimizer
+    return algorithm(CustomActorCriticPolicy, # Architecture type
         env,                            # Environment
         policy_kwargs=policy_kwargs,
         verbose=1,                   
@@ -0,0 +1,244 @@
+"""
+Per-step episode recording into preallocated NumPy columns.
+
+An EpisodeRecorder holds one float64 column per field in a single [fields, capacity] buffer that doubles when
+full, so recording a step is one slice assignment and reading a field back is a contiguous view, with no
+per-step Python lists or tuples kept around. Levels:
+    'off': record() does nothing.
+    'summary': Only the step count, the per-field totals and the last values are kept.
+    'full': Every step is kept, plus the summary.
+VecEpisodeRecorder does the same for a batch of envs at once.
+EpisodeWriter persists finished episodes on a background thread, so disk I/O overlaps with training.
+"""
+import queue
+import threading
+import numpy as np
+
+RECORDING_LEVELS = ('off', 'summary', 'full')
+WRITER_POLICIES = ('block', 'drop')  # What EpisodeWriter.submit does when the queue is full
+
+
+# EpisodeRecorder records one episode at a time; reset() starts the next one and reuses the buffers.
+# record() is bound to the level's method at construction, so the 'off' level costs one no-op call per step.
+class EpisodeRecorder:
+    def __init__(self, fields, level='full', capacity=1024):
+        """
+        Args:
+            fields: Names of the recorded values, in the order record() takes them (tuple of str).
+            level: 'off', 'summary' or 'full' (str).
+            capacity: Steps preallocated for 'full'; doubled whenever an episode outgrows it (int).
+        """
+        if level not in RECORDING_LEVELS:
+            raise ValueError(f"Recording level '{level}' is not registered.")
+        self.fields = tuple(fields)
+        self.level = level
+        self.steps = 0
+        self.total = np.zeros(len(self.fields))
+        self.last = np.zeros(len(self.fields))
+        self.buffer = np.zeros((len(self.fields), capacity if level == 'full' else 0))
+        self.record = {'off': self._record_off, 'summary': self._record_summary, 'full': self._record_full}[level]
+
+    def __len__(self):
+        return self.steps
+
+    def reset(self):
+        """Starts a new episode (the previous one's columns are overwritten from now on)"""
+        self.steps = 0
+        self.total[:] = 0.0
+        self.last[:] = 0.0
+
+    def _record_off(self, values):
+        pass
+
+    def _record_summary(self, values):
+        self.last[:] = values
+        self.total += self.last
+        self.steps += 1
+
+    def _record_full(self, values):
+        if self.steps == self.buffer.shape[1]:
+            self._grow()
+        self.buffer[:, self.steps] = values
+        self.last[:] = values
+        self.total += self.last
+        self.steps += 1
+
+    def _grow(self):
+        buffer = np.zeros((len(self.fields), max(2 * self.buffer.shape[1], 1)))
+        buffer[:, :self.steps] = self.buffer[:, :self.steps]
+        self.buffer = buffer
+
+    def column(self, name):
+        """View of one field over the steps of this episode ('full' level only; valid until reset())"""
+        if self.level != 'full':
+            raise ValueError(f"Recording level '{self.level}' does not keep columns.")
+        return self.buffer[self.fields.index(name), :self.steps]
+
+    def columns(self):
+        """Dict of {field: view [steps]} for this episode ('full' level only)"""
+        return {name: self.column(name) for name in self.fields}
+
+    def summary(self):
+        """
+        Returns: Dict with the number of 'steps' and, per field, its sum ('total_<field>') and last value
+                 ('final_<field>'). Empty for the 'off' level.
+        """
+        if self.level == 'off':
+            return {}
+        summary = {'steps': self.steps}
+        for name, total, last in zip(self.fields, self.total.tolist(), self.last.tolist()):
+            summary[f'total_{name}'] = total
+            summary[f'final_{name}'] = last
+        return summary
+
+
+# VecEpisodeRecorder records the current episode of each of num_envs envs side by side, e.g. for a VecEnv.
+# One record() call appends a step to every env with a single fancy-indexed assignment into a
+# [num_envs, fields, capacity] buffer; envs whose episode ended are reset() individually.
+class VecEpisodeRecorder:
+    def __init__(self, num_envs, fields, level='full', capacity=1024):
+        """
+        Args:
+            num_envs: Number of envs recorded side by side (int).
+            fields: Names of the recorded values, in the order of record()'s rows (tuple of str).
+            level: 'off', 'summary' or 'full', as for EpisodeRecorder (str).
+            capacity: Steps preallocated per env for 'full'; doubled whenever an episode outgrows it (int).
+        """
+        if level not in RECORDING_LEVELS:
+            raise ValueError(f"Recording level '{level}' is not registered.")
+        self.num_envs = num_envs
+        self.fields = tuple(fields)
+        self.level = level
+        self.envs = np.arange(num_envs)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.total = np.zeros((num_envs, len(self.fields)))
+        self.last = np.zeros((num_envs, len(self.fields)))
+        self.buffer = np.zeros((num_envs, len(self.fields), capacity if level == 'full' else 0))
+        self.record = {'off': self._record_off, 'summary': self._record_summary, 'full': self._record_full}[level]
+
+    def reset(self, envs):
+        """Starts new episodes for the envs at indices envs"""
+        self.steps[envs] = 0
+        self.total[envs] = 0.0
+        self.last[envs] = 0.0
+
+    def _record_off(self, values):
+        pass
+
+    def _record_summary(self, values):
+        self.last[:] = np.asarray(values).T
+        self.total += self.last
+        self.steps += 1
+
+    def _record_full(self, values):
+        if self.steps.max() == self.buffer.shape[2]:
+            self._grow()
+        self.last[:] = np.asarray(values).T
+        self.buffer[self.envs, :, self.steps] = self.last
+        self.total += self.last
+        self.steps += 1
+
+    def _grow(self):
+        capacity = self.buffer.shape[2]
+        buffer = np.zeros(self.buffer.shape[:2] + (max(2 * capacity, 1),))
+        buffer[:, :, :capacity] = self.buffer
+        self.buffer = buffer
+
+    def columns(self, env):
+        """Dict of {field: view [steps]} for env's current episode ('full' level only; valid until reset())"""
+        if self.level != 'full':
+            raise ValueError(f"Recording level '{self.level}' does not keep columns.")
+        steps = self.steps[env]
+        return {name: self.buffer[env, i, :steps] for i, name in enumerate(self.fields)}
+
+    def summary(self, env):
+        """EpisodeRecorder.summary() of env's current episode"""
+        if self.level == 'off':
+            return {}
+        summary = {'steps': int(self.steps[env])}
+        for name, total, last in zip(self.fields, self.total[env].tolist(), self.last[env].tolist()):
+            summary[f'total_{name}'] = total
+            summary[f'final_{name}'] = last
+        return summary
+
+
+def save_npz(path, columns):
+    """Default EpisodeWriter write: one .npz file per episode"""
+    np.savez(path, **columns)
+
+
+# EpisodeWriter runs write(*args) for every submit(*args) on one background thread, in submission order.
+# Submitted arrays must not change afterwards (pass copies of recorder views). A failing write does not stop the
+# later ones: its exception is kept and the first one kept is re-raised by the next submit(), flush() or close(),
+# while `failed` counts every episode that could not be written.
+class EpisodeWriter:
+    def __init__(self, write=save_npz, max_pending=16, policy='block'):
+        """
+        Args:
+            write: Function persisting one episode (callable), by default save_npz(path, columns).
+            max_pending: Episodes queued before the policy applies (int).
+            policy: When the queue is full, 'block' the caller until there is room, or 'drop' the episode and
+                    count it in `dropped` (str).
+        """
+        if policy not in WRITER_POLICIES:
+            raise ValueError(f"Writer policy '{policy}' is not registered.")
+        self.write = write
+        self.policy = policy
+        self.dropped = 0
+        self.failed = 0
+        self.errors = []  # Exceptions of failed writes not raised yet
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='EpisodeWriter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            args = self._queue.get()
+            try:
+                if args is None:
+                    return
+                self.write(*args)
+            except Exception as error:
+                self.failed += 1
+                self.errors.append(error)
+            finally:
+                self._queue.task_done()
+
+    @property
+    def closed(self):
+        return not self._thread.is_alive()
+
+    def _raise_error(self):
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise errors[0]
+
+    def submit(self, *args):
+        """
+        Queues write(*args).
+        Returns: False if the episode was dropped because the queue was full, else True.
+        """
+        self._raise_error()
+        if self.closed:
+            raise RuntimeError('EpisodeWriter is closed.')
+        if self.policy == 'block':
+            self._queue.put(args)
+            return True
+        try:
+            self._queue.put_nowait(args)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self):
+        """Waits until every queued episode is written"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Writes the pending episodes and stops the thread; later calls do nothing"""
+        if not self.closed:
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
@@ -0,0 +1,102 @@
+"""
+Hohmann transfer reference trajectory used by the training rewards.
+
+An episode starting on a circular orbit of radius init_r is compared against the transfer ellipse to r_final:
+r_expected(t) = a (1 - e cos E(t)) while t is below half the ellipse's period, r_final afterwards, with E from
+Kepler's equation (kepler.solve_kepler). The transfer constants only depend on init_r, so they are computed once
+per episode, and r_expected at every step k * dt is tabulated once per (init_r, dt); the reward then reads
+table[k] instead of re-deriving the ellipse every step.
+"""
+import math
+import numpy as np
+import kepler
+
+
+# HohmannReference computes and caches the reference tables for one (GM, r_final, dt).
+# Tables are indexed by the step counter k (t = k * dt) and end with r_final, so any k past the end reads r_final.
+class HohmannReference:
+    def __init__(self, GM=1.0, r_final=1.0, dt=0.01, cache_size=1024):
+        """
+        Args:
+            GM: Gravitational constant (float).
+            r_final: Target radius of the transfer (float).
+            dt: Time step of the environment (float).
+            cache_size: Tables kept, the oldest is dropped first (int).
+        """
+        self.GM = GM
+        self.r_final = r_final
+        self.dt = dt
+        self.cache_size = cache_size
+        self._tables = {}  # (init_r, dt): r_expected per step
+
+    def transfer(self, init_r):
+        """
+        Transfer ellipse constants for initial radii init_r (scalar or [N]).
+        Returns: Dict of 'a', 'e' (negative when moving inwards), 'n' (mean motion) and 'transfer_time'.
+        """
+        init_r = np.asarray(init_r, dtype=np.float64)
+        a = (init_r + self.r_final) / 2
+        n = np.sqrt(self.GM / a**3)
+        return {
+            'a': a,
+            'e': (self.r_final - init_r) / (self.r_final + init_r),
+            'n': n,
+            'transfer_time': np.pi / n,
+        }
+
+    def radius(self, init_r, t):
+        """Exact r_expected at times t for initial radii init_r (broadcast together)"""
+        init_r, t = np.broadcast_arrays(np.asarray(init_r, dtype=np.float64), np.asarray(t, dtype=np.float64))
+        c = self.transfer(init_r)
+        E = kepler.solve_kepler(c['n'] * t, c['e'])
+        return np.where(t < c['transfer_time'], c['a'] * (1 - c['e'] * np.cos(E)), self.r_final)
+
+    def table_length(self, init_r):
+        """Length of the table of init_r: the steps inside the transfer plus the final r_final entry"""
+        transfer_time = float(self.transfer(init_r)['transfer_time'])
+        return math.ceil(transfer_time / self.dt) + 1
+
+    def table(self, init_r, cache=True):
+        """
+        r_expected at t = k * dt for k = 0 .. table_length(init_r) - 1 (do not modify).
+        Args:
+            cache: Keep the table for the next call with this init_r; only worth it when episodes share a fixed
+                   init_r, random ones would just churn the cache (bool).
+        """
+        key = (float(init_r), self.dt)
+        table = self._tables.get(key)
+        if table is None:
+            table = self.radius(init_r, np.arange(self.table_length(init_r)) * self.dt)
+            if cache:
+                if len(self._tables) >= self.cache_size:
+                    del self._tables[next(iter(self._tables))]
+                self._tables[key] = table
+        return table
+
+    def tables(self, init_r, width):
+        """
+        Tables of several initial radii [N] padded with r_final to [N, width], computed together in one
+        radius() call over every row's transfer steps. Radii that are all equal (a fixed r0) share one cached
+        table instead.
+        """
+        init_r = np.asarray(init_r, dtype=np.float64)
+        if len(init_r) == 0:
+            return np.zeros((0, width))
+        # The transfer time grows with init_r, so the largest one needs the longest table
+        if self.table_length(init_r.max()) > width:
+            raise ValueError(f"Reference table width '{width}' is too small for init_r '{init_r.max()}'.")
+        out = np.full((len(init_r), width), float(self.r_final))
+        if np.all(init_r == init_r[0]):
+            table = self.table(init_r[0])
+            out[:, :len(table)] = table
+            return out
+        # Only the steps inside each transfer need Kepler's equation, all rows' steps in one flat batch
+        t = np.arange(width) * self.dt
+        rows, steps = np.nonzero(t[None, :] < self.transfer(init_r)['transfer_time'][:, None])
+        out[rows, steps] = self.radius(init_r[rows], t[steps])
+        return out
+
+    @staticmethod
+    def lookup(table, step):
+        """r_expected at step counter `step` from one table (past its end: r_final)"""
+        return table[min(step, len(table) - 1)]
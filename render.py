@@ -6,8 +6,10 @@ from matplotlib import animation
 from matplotlib.collections import LineCollection
 from matplotlib.patches import Circle
 from matplotlib.gridspec import GridSpec
+from episode_store import EpisodeStore
 
 # Renderer is responsible for dynamically rendering the episode data from the test phase using matplotlib.
+# Episodes are read from the EpisodeStore in '<data_type>/episodes', or from episode_N.npz files for older runs.
 class Renderer:
     def __init__(self, model_save_path):
         """
@@ -21,6 +23,7 @@ class Renderer:
         self.reward_history = []
         self.fig = None
         self.state = None
+        self.stores = {}  # data_type: EpisodeStore, or None for runs saved as .npz files
 
         # Dictionary to store figure generation functions by name
         self.fig_generators = {
@@ -29,15 +32,17 @@ class Renderer:
 
     def load_data(self, episode_num, data_type="testing"):
         """
-        Loads the state, action, reward, and timestep data from a storage file.
+        Loads the state, action, reward, and timestep data from the run's episode store (or .npz file).
         Args: 
             episode_num: Episode number to load (int).
             data_type: Folder from which to load data ('testing' or 'training') (str, optional).
         Returns: None. Updates internal state variables with loaded data.
         """
-        data_dir = os.path.join(self.model_save_path, data_type)
-        filepath = os.path.join(data_dir, f'episode_{episode_num}.npz')
-        data = np.load(filepath)
+        store = self._store(data_type)
+        if store is not None:
+            data = store.load(episode_num)  # Zero-copy views of the store's columns
+        else:
+            data = np.load(os.path.join(self.model_save_path, data_type, f'episode_{episode_num}.npz'))
         
         x = data['x']
         y = data['y']
@@ -76,12 +81,8 @@ class Renderer:
                          returns True will be rendered. If None, the provided episode_num will be used (function, optional).
             data_type: Folder from which to load data ('testing' or 'training') (str, optional).
         """
-        data_dir = os.path.join(self.model_save_path, data_type)
-        episode_files = [f for f in os.listdir(data_dir) if f.startswith('episode_') and f.endswith('.npz')]
-        episode_numbers = [int(f.split('_')[1].split('.')[0]) for f in episode_files]
-
         if filter_func is not None:
-            episode_numbers = list(filter(filter_func, episode_numbers))
+            episode_numbers = list(filter(filter_func, self.episode_numbers(data_type)))
         else:
             episode_numbers = [episode_num]
 
@@ -94,6 +95,24 @@ class Renderer:
             else:
                 raise ValueError(f"Figure type '{fig_name}' is not registered.")
 
+    def episode_numbers(self, data_type="testing"):
+        """
+        Args: data_type: Folder from which to load data ('testing' or 'training') (str, optional).
+        Returns: Sorted list of the episode numbers stored for data_type.
+        """
+        store = self._store(data_type)
+        if store is not None:
+            return sorted(set(store.episodes().tolist()))
+        data_dir = os.path.join(self.model_save_path, data_type)
+        episode_files = [f for f in os.listdir(data_dir) if f.startswith('episode_') and f.endswith('.npz')]
+        return sorted(int(f.split('_')[1].split('.')[0]) for f in episode_files)
+
+    def _store(self, data_type):
+        if data_type not in self.stores:
+            path = os.path.join(self.model_save_path, data_type, 'episodes')
+            self.stores[data_type] = EpisodeStore(path) if EpisodeStore.exists(path) else None
+        return self.stores[data_type]
+
     def _generate_combined_fig(self, interval, episode_num, data_type):
         """
         Generates the default combined figure with radius, action, and orbit plots.
@@ -14,28 +14,23 @@ model_path = './models/model_22-51-24-_18-05-2025/ppo_orbital_model.zip'  # Upda
 # Load trained PPO model
 model = PPO.load(model_path)
 
-# Helper: convert raw state to processed observation (as in OrbitalEnvWrapper._convert_state)
-def convert_state(state, env, ship):
-    x, y, vx, vy = state
-    r = np.sqrt(x**2 + y**2)
-    r = max(r, 1e-5)
-    v_radial = (x * vx + y * vy) / r
-    v_tangential = (x * vy - y * vx) / r
+# Helper: convert a ship's state to the processed observation (as in OrbitalEnvWrapper._convert_state),
+# using the orbital elements the environment computes every tick
+def convert_state(ship):
+    r = ship['r']
     initial_r = ship['init_r']
     flag = 1.0 if np.abs(r - 1.0) < 0.01 else 0.0
-    specific_energy = 0.5 * (vx**2 + vy**2) - env.GM / r
-    angular_momentum = r * v_tangential
     r_err = r - 1.0
     r_max_err = max(abs(initial_r - 1), 1e-2)
     scaled_r_err = np.clip((r_err / r_max_err) * 2, -2, 2)
     obs = np.array([
         scaled_r_err,
-        v_radial,
-        v_tangential,
+        ship['v_radial'],
+        ship['v_tangential'],
         1 - initial_r,
         flag,
-        specific_energy,
-        angular_momentum
+        ship['energy'],
+        ship['angular_momentum']
     ], dtype=np.float32)
     return obs
 
@@ -55,8 +50,7 @@ for t in range(num_steps):
     actions = {}
     for sid in ship_ids:
         ship = env.ships[sid]
-        state = np.array([ship['x'], ship['y'], ship['vx'], ship['vy']], dtype=np.float32)
-        obs = convert_state(state, env, ship)
+        obs = convert_state(ship)
         obs_tensor = torch.from_numpy(obs).float().unsqueeze(0)
         with torch.no_grad():
             action, _ = model.predict(obs_tensor, deterministic=True)
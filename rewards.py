@@ -0,0 +1,59 @@
+"""
+Reward registry shared by OrbitalEnvironment, OrbitalEnvWrapper and VecOrbitalEnv.
+
+Every reward takes a batch, a dict of arrays [N] (one entry per env), and returns the rewards [N] with NumPy
+operations over the whole batch, so 1024 envs cost one call. Environments fill in what they have:
+    x, y, vx, vy: State after the step.
+    r: Radius after the step.
+    action: Tangential thrust applied during the step.
+    init_r: Initial orbital radius of the episode.
+    r_final: Target radius (float).
+    r_err_norm, d_r_err_norm, int_r_err_norm: Normalized Hohmann tracking errors (wrapper envs only).
+    time_factor: Elapsed fraction of the episode's time limit (wrapper envs only).
+Single-env callers pass floats instead of arrays [1], which the NumPy operations handle as well and which is
+much cheaper per step; they may get a 0-d array back, so they wrap the result in float().
+Rewards are selected by name, e.g. VecOrbitalEnv(reward='hohmann'); register_reward adds new ones.
+"""
+import numpy as np
+
+REWARDS = {}  # name: reward(batch) -> rewards [N]
+
+
+def register_reward(name):
+    """Decorator that registers a batched reward under `name`"""
+    def register(reward):
+        REWARDS[name] = reward
+        return reward
+    return register
+
+
+def get_reward(name):
+    """Returns the reward function registered under `name`"""
+    if name not in REWARDS:
+        raise ValueError(f"Reward '{name}' is not registered.")
+    return REWARDS[name]
+
+
+@register_reward('radius')
+def radius_reward(batch):
+    """Exponential radial difference to r_final, scaled by the starting offset, times an action penalty"""
+    r_err = batch['r'] - batch['r_final']
+    r_max_err = np.maximum(np.abs(batch['init_r'] - batch['r_final']), 1e-2)
+    scaled_r_err = np.clip((r_err / r_max_err) * 2, -2, 2)
+    return np.exp(-scaled_r_err**2) * np.exp(-batch['action']**2)
+
+
+@register_reward('hohmann')
+def hohmann_reward(batch, k1=1.0, k2=1.0, k3=1.0, min_reward=0.01):
+    """
+    PID-style tracking of the Hohmann reference: product of exponential penalties on the radius error, its rate
+    and its integral, growing stricter over the episode; min_reward when the ship is far off course.
+    """
+    growth = 1 + batch['time_factor']
+    penalty_r_err = np.exp(-k1 * np.abs(batch['r_err_norm']) * growth)
+    penalty_d_r_err = np.exp(-k2 * np.abs(batch['d_r_err_norm']) * growth)
+    penalty_int_r_err = np.exp(-k3 * np.abs(batch['int_r_err_norm']) * growth)
+    reward = np.maximum(penalty_r_err * penalty_d_r_err * penalty_int_r_err, min_reward)
+
+    off_course = (batch['r'] > 2 * batch['r_final']) | (batch['r'] < batch['init_r'] / 2)
+    return np.where(off_course, min_reward, reward)
@@ -1,13 +1,14 @@
 import os
 from environment import OrbitalEnvWrapper
+from vec_env import VecOrbitalEnv
 from stable_baselines3 import PPO
 from render import Renderer
 from model import create_model
 from train import train_model
 from test import test_model
 
-# Create the training environment
-env_train = OrbitalEnvWrapper()
+# Create the training environment: 8 episodes stepped together as NumPy arrays
+env_train = VecOrbitalEnv(num_envs=8)
 
 # Train the model
 save_dir = './models'
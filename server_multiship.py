@@ -8,6 +8,7 @@ from fastapi.responses import FileResponse  # for serving files
 from fastapi.middleware.cors import CORSMiddleware  # Allow cross-origin requests from frontend
 from stable_baselines3 import PPO  # Pre-trained reinforcement learning model
 from environment import MultiShipOrbitalEnvironment  # Custom physics environment
+from timestep import FixedTimestep  # Decouples physics steps from network ticks
 
 # Imports below for functionality having server accessible from all devices on same network
 from fastapi.staticfiles import StaticFiles
@@ -58,8 +59,14 @@ app.add_middleware(
 )
 
 ######################## INITIALIZE PHYSICS ENVIRONMENT ########################
+# Physics and network rates are independent: each network tick runs as many fixed physics steps as
+# wall-clock time requires (e.g. PHYSICS_RATE=240 TICK_RATE=20 runs 12 substeps per broadcast)
+physics_rate = float(os.environ.get("PHYSICS_RATE", 60))  # Physics steps per second
+tick_rate = float(os.environ.get("TICK_RATE", 60))  # Network ticks (action requests + broadcasts) per second
+clock = FixedTimestep(physics_hz=physics_rate, network_hz=tick_rate)
+
 # Initialize the shared physics environment that all ships exist in
-env = MultiShipOrbitalEnvironment(dt=1.0/60.0)
+env = MultiShipOrbitalEnvironment(dt=clock.physics_dt, coupled=True)  # All ships integrated as one coupled N-body system
 
 # Dictionary to store all connected clients and their metadata
 # Key: client_id (UUID), Value: dict with websocket, type, ship_id, and model info
@@ -75,8 +82,10 @@ baseline_ship_id = "baseline_ship"  # Special ID for the AI-controlled baseline
 baseline_model_loaded = None  # The loaded PPO model for the baseline ship
 
 # Tick-based authoritative networking
-current_tick = 0  # Current authoritative simulation tick
-tick_rate = 60  # Simulation ticks per second
+current_tick = 0  # Current authoritative network tick
+previous_states = {}  # Ship states one physics step before the latest, for interpolating broadcasts
+current_states = {}  # Ship states after the latest physics step
+states_version = None  # env.ships.version when current_states was taken
 
 # Lockstep simulation - wait for all clients before advancing
 pending_actions = {}  # client_id: action for current tick
@@ -208,31 +217,17 @@ def clear_pending_actions():
     pending_actions.clear()
 
 ######################## HELPER FUNCTIONS ########################
-# Helper function to convert raw ship state (x,y,vx,vy) into the 7-dimensional observation
-# that the AI model expects (this matches the run_and_view_episode.py training environment)
-def convert_state(state, env, ship):
-    # Extract position and velocity components
-    x, y, vx, vy = state 
-    
-    # Calculate distance from center (central mass)
-    r = np.sqrt(x**2 + y**2)
-    r = max(r, 1e-5)  
-    
-    # Calculate radial and tangential velocity components
-    v_radial = (x * vx + y * vy) / r  # Velocity toward/away from center
-    v_tangential = (x * vy - y * vx) / r  # Velocity perpendicular to radial direction
-
+# Helper function to convert a ship's state into the 7-dimensional observation
+# that the AI model expects (this matches the run_and_view_episode.py training environment).
+# Radius, velocity components, energy and angular momentum come from the orbital elements
+# the environment already computed for every ship this tick.
+def convert_state(ship):
+    r = ship['r']  # Distance from center (central mass)
     initial_r = ship['init_r']  # Initial orbital radius
     
     # Flag indicating if ship is very close to target orbit (radius 1.0)
     flag = 1.0 if np.abs(r - 1.0) < 0.01 else 0.0
     
-    # Calculate specific energy (kinetic + potential)
-    specific_energy = 0.5 * (vx**2 + vy**2) - env.GM / r
-    
-    # Calculate angular momentum
-    angular_momentum = r * v_tangential
-    
     # Calculate radial error from target orbit
     r_err = r - 1.0
     r_max_err = max(abs(initial_r - 1), 1e-2)  # Maximum expected error
@@ -240,13 +235,13 @@ def convert_state(state, env, ship):
     
     # Return 7-dimensional observation vector for the AI model
     obs = np.array([
-        scaled_r_err,      # How far from target orbit (scaled)
-        v_radial,          # Radial velocity component
-        v_tangential,      # Tangential velocity component
-        1 - initial_r,     # Initial orbital error
-        flag,              # Whether at target orbit
-        specific_energy,   # Total energy
-        angular_momentum   # Angular momentum
+        scaled_r_err,              # How far from target orbit (scaled)
+        ship['v_radial'],          # Radial velocity component
+        ship['v_tangential'],      # Tangential velocity component
+        1 - initial_r,             # Initial orbital error
+        flag,                      # Whether at target orbit
+        ship['energy'],            # Total energy
+        ship['angular_momentum']   # Angular momentum
     ], dtype=np.float32)
     return obs
 
@@ -276,7 +271,10 @@ def remove_baseline_ship():
 
 async def global_simulation_loop():
     """Global simulation loop that runs lockstep - waits for all client actions before advancing"""
-    global simulation_running, trail_history, current_tick, pending_actions
+    global simulation_running, trail_history, current_tick, pending_actions, previous_states, current_states
+    global states_version
+    loop = asyncio.get_event_loop()
+    next_tick_time = loop.time()
     
     while simulation_running:  # Continue until simulation is stopped
         current_tick += 1  # Increment authoritative tick
@@ -314,10 +312,8 @@ async def global_simulation_loop():
                 # Handle baseline ship (always uses the pre-trained PPO model)
                 if baseline_ship_id in env.ships and not env.ships[baseline_ship_id]['done']:
                     ship = env.ships[baseline_ship_id]  # Get baseline ship state
-                    # Convert ship state to numpy array for model input
-                    state = np.array([ship['x'], ship['y'], ship['vx'], ship['vy']], dtype=np.float32)
                     # Convert to 7-dimensional observation for the AI model
-                    obs = convert_state(state, env, ship)
+                    obs = convert_state(ship)
                     # Convert to PyTorch tensor and add batch dimension
                     obs_tensor = torch.from_numpy(obs).float().unsqueeze(0)
                     # Use the model to predict action (no gradient computation needed)
@@ -348,8 +344,7 @@ async def global_simulation_loop():
                             ship = env.ships[ship_id]
                             
                             # Convert ship state to observation for the AI model (same as baseline)
-                            state = np.array([ship['x'], ship['y'], ship['vx'], ship['vy']], dtype=np.float32)
-                            obs = convert_state(state, env, ship)
+                            obs = convert_state(ship)
                             obs_tensor = torch.from_numpy(obs).float().unsqueeze(0)
                             
                             # Use the client's uploaded model to predict action
@@ -361,8 +356,21 @@ async def global_simulation_loop():
                             client['last_action'] = float(action[0])
                             print(f"Model client {client_id} action: {float(action[0]):.3f}")
                 
-                # Step the physics environment forward by one timestep with all actions
-                env.step(actions)
+                # Step the physics environment forward by as many fixed timesteps as have elapsed,
+                # holding this tick's actions for all of them
+                substeps = clock.substeps(loop.time())
+                for substep in range(substeps):
+                    if substep == substeps - 1:
+                        # States one physics step before the latest: the last tick's, unless this tick runs
+                        # several steps or ships were added or removed since
+                        if substep == 0 and states_version == env.ships.version:
+                            previous_states = current_states
+                        else:
+                            previous_states = env.get_states()
+                    env.step(actions)
+                if substeps or states_version != env.ships.version:
+                    current_states = env.get_states()
+                    states_version = env.ships.version
                 
                 # Update leaderboard steps for all alive ships
                 for ship_id, ship in env.ships.items():
@@ -383,8 +391,9 @@ async def global_simulation_loop():
                     if len(trail_history[ship_id]) > 1000:
                         trail_history[ship_id] = trail_history[ship_id][-1000:]
                 
-                # Get current state of all ships for broadcasting to clients
-                states = env.get_states()
+                # State of all ships for broadcasting to clients, blended between the last two physics states by
+                # the accumulated fraction of a step, so it trails wall-clock time by (1 - alpha) of a physics step
+                states = clock.interpolate(previous_states, current_states)
                 
                 # Get current top 10 leaderboard
                 top_leaderboard = get_top_leaderboard()
@@ -399,7 +408,7 @@ async def global_simulation_loop():
                         payload = {
                             # "ships": states,  # Current state of all ships
                             # Get current state of all ships and their names
-                            "ships": {sid: {**state, "name": leaderboard.get(sid, {}).get("name", sid[:8])} for sid, state in env.get_states().items()},
+                            "ships": {sid: {**state, "name": leaderboard.get(sid, {}).get("name", sid[:8])} for sid, state in states.items()},
                             "your_ship_id": client.get('ship_id'),  # This client's ship ID
                             "trail_history": trail_history,  # Historical trail data
                             "leaderboard": top_leaderboard,  # Current leaderboard
@@ -450,9 +459,13 @@ async def global_simulation_loop():
                             trail_history.clear()  # Clear all trails
                             add_baseline_ship()  # Add new baseline ship
                             env.current_step = 0  # Reset step counter
+            else:
+                # No physics runs without ships, so idle time must not pile up into a burst of substeps
+                clock.reset()
         
-        # Wait 16.7ms (60Hz simulation rate) before next physics step
-        await asyncio.sleep(0.0167)
+        # Wait until the next network tick (tick_rate Hz), however long this one took
+        next_tick_time = max(next_tick_time + clock.network_dt, loop.time())
+        await asyncio.sleep(next_tick_time - loop.time())
 
 ######################## START & STOP SIMULATION ########################
 async def start_simulation():
@@ -461,6 +474,7 @@ async def start_simulation():
     
     if not simulation_running:  # Only start if not already running
         simulation_running = True  # Set flag to start simulation
+        clock.reset()  # Start accumulating physics time from now
         # Add baseline ship when simulation starts (first client joins)
         # add_baseline_ship()
         # Create async task to run the simulation loop
@@ -1,6 +1,11 @@
 from stable_baselines3 import PPO
 import numpy as np
 import os
+from recording import EpisodeRecorder
+from episode_store import EpisodeStore
+
+EPISODE_FIELDS = ('x', 'y', 'vx', 'vy', 'episode_step', 'action', 'reward', 'r_err_norm', 'd_r_err_norm',
+                  'int_r_err_norm')
 
 """ Runs a test episode of the trained model on the environment and saves the results. """
 def test_model(env, model_path, model_save_path, episode_num):
@@ -12,7 +17,7 @@ def test_model(env, model_path, model_save_path, episode_num):
         episode_num: Number to identify the episode (int).
 
     Returns:
-        None. Saves the test episode data to a file.
+        None. Appends the test episode data to the store in the 'testing/episodes' folder.
     """
     # Ensure the directory for saving testing data exists
     test_data_dir = os.path.join(model_save_path, "testing")
@@ -21,35 +26,20 @@ def test_model(env, model_path, model_save_path, episode_num):
     model = PPO.load(model_path)
     obs = env.reset()
     done = False
-    episode_data = []  # To store the test episode data
+    recorder = EpisodeRecorder(EPISODE_FIELDS)  # To store the test episode data
     timestep = 0  # Initialize a manual timestep tracker
 
     while not done:
         action, _ = model.predict(obs, deterministic=True)
         obs, reward, done, info = env.step(action)
         x, y, vx, vy = env.state
-        r_err_norm = info['r_err_norm']
-        d_r_err_norm = info['d_r_err_norm']
-        int_r_err_norm = info['int_r_err_norm']
-
-        # Append data with new quantities
-        episode_data.append([
-            x, y, vx, vy, timestep, action, reward,
-            r_err_norm, d_r_err_norm, int_r_err_norm
-        ])
+
+        # Record the step's quantities
+        recorder.record((x, y, vx, vy, timestep, np.squeeze(action), reward,
+                         info['r_err_norm'], info['d_r_err_norm'], info['int_r_err_norm']))
         timestep += 1
 
     # Save the episode data to the test data directory
-    np.savez(os.path.join(test_data_dir, f'episode_{episode_num}.npz'),
-             x=np.array([step[0] for step in episode_data]),
-             y=np.array([step[1] for step in episode_data]),
-             vx=np.array([step[2] for step in episode_data]),
-             vy=np.array([step[3] for step in episode_data]),
-             episode_step=np.array([step[4] for step in episode_data]),
-             action=np.array([step[5] for step in episode_data]),
-             reward=np.array([step[6] for step in episode_data]),
-             r_err_norm=np.array([step[7] for step in episode_data]),
-             d_r_err_norm=np.array([step[8] for step in episode_data]),
-             int_r_err_norm=np.array([step[9] for step in episode_data]))
+    EpisodeStore(os.path.join(test_data_dir, 'episodes'), EPISODE_FIELDS).append(recorder.columns(), episode_num)
 
     print(f"Test episode {episode_num} completed and saved in {test_data_dir}")
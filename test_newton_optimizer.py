@@ -0,0 +1,69 @@
+"""Smoke tests of NewtonOptimizer's modes and of training the policy with it (python -m pytest)."""
+import pytest
+import torch
+import torch.nn as nn
+from model import NewtonOptimizer, create_model
+from vec_env import VecOrbitalEnv
+
+# Quadratic 0.5 x^T A x - b^T x with a diagonal A, so every mode (even the Hutchinson diagonal, exact for a
+# diagonal Hessian) reaches the minimum A^-1 b in one step
+A = torch.tensor([4.0, 1.0, 0.25])
+B = torch.tensor([1.0, -2.0, 0.5])
+
+
+def quadratic(x):
+    return 0.5 * (A * x * x).sum() - (B * x).sum()
+
+
+@pytest.mark.parametrize('mode', NewtonOptimizer.MODES)
+def test_quadratic_step_reaches_minimum(mode):
+    x = nn.Parameter(torch.zeros(3))
+    optimizer = NewtonOptimizer([x], lr=1.0, damping=1e-6, mode=mode, cg_iters=3)
+    quadratic(x).backward(create_graph=True)
+    optimizer.step()
+    assert torch.allclose(x.detach(), B / A, atol=1e-3)
+
+
+@pytest.mark.parametrize('mode', NewtonOptimizer.MODES)
+def test_network_step_lowers_loss(mode):
+    torch.manual_seed(0)
+    net = nn.Sequential(nn.Linear(3, 8), nn.Tanh(), nn.Linear(8, 1))
+    inputs, targets = torch.randn(64, 3), torch.randn(64, 1)
+    optimizer = NewtonOptimizer(net.parameters(), lr=0.5, damping=1e-1, mode=mode, adapt_damping=True)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = nn.functional.mse_loss(net(inputs), targets)
+        loss.backward(create_graph=True)
+        return loss
+
+    first = closure().item()
+    for _ in range(5):
+        optimizer.step(closure)
+    assert nn.functional.mse_loss(net(inputs), targets).item() < first
+    assert optimizer.reduction_ratio is not None
+
+
+def test_gradients_without_graph_raise():
+    x = nn.Parameter(torch.zeros(3))
+    optimizer = NewtonOptimizer([x], mode='cg')
+    quadratic(x).backward()
+    with pytest.raises(RuntimeError):
+        optimizer.step()
+
+
+def test_create_model_defaults_to_adam():
+    model = create_model(VecOrbitalEnv(num_envs=2, seed=0))
+    assert isinstance(model.policy.optimizer, torch.optim.Adam)
+
+
+def test_create_model_trains_with_hessian_free_newton():
+    env = VecOrbitalEnv(num_envs=2, seed=0)
+    model = create_model(env, optimizer='newton')
+    model.n_steps, model.batch_size, model.n_epochs = 64, 64, 1
+    model._setup_model()
+    assert isinstance(model.policy.optimizer, NewtonOptimizer)
+    assert model.policy.optimizer.param_groups[0]['mode'] == 'cg'
+    before = [p.detach().clone() for p in model.policy.parameters()]
+    model.learn(total_timesteps=128)
+    assert any(not torch.equal(p, q) for p, q in zip(model.policy.parameters(), before))
@@ -0,0 +1,86 @@
+"""
+Fixed-timestep accumulator that decouples the physics rate from the network (broadcast) rate.
+
+Wall-clock time between network ticks is added to an accumulator and spent in whole physics steps of a fixed dt,
+so the simulation advances at real time whatever the two rates are. What is left over (less than one physics
+step) is used to interpolate the broadcast state between the last two physics states, so broadcasts trail
+wall-clock time by less than one physics step.
+"""
+import math
+
+# Ship fields that are blended between physics states for the broadcast: the state and the orbital elements
+# derived from it, so that a broadcast describes a single moment
+INTERPOLATED_FIELDS = ('x', 'y', 'vx', 'vy', 'heading', 'r', 'v_radial', 'v_tangential', 'energy', 'angular_momentum',
+                       'semi_major_axis', 'eccentricity')
+
+
+# FixedTimestep hands out the number of physics substeps to run on each network tick.
+# Takes the physics rate and network rate in Hz, and a cap on substeps per tick so a stalled
+# server drops time instead of trying to catch up forever.
+class FixedTimestep:
+    def __init__(self, physics_hz=60.0, network_hz=60.0, max_substeps=None):
+        """
+        Args:
+            physics_hz: Physics steps per second; the environment's dt is 1 / physics_hz (float).
+            network_hz: Network ticks (action requests and broadcasts) per second (float).
+            max_substeps: Most physics steps run on one network tick. Defaults to four ticks' worth (int or None).
+        """
+        self.physics_dt = 1.0 / physics_hz
+        self.network_dt = 1.0 / network_hz
+        self.max_substeps = max_substeps or 4 * math.ceil(physics_hz / network_hz)
+        self.accumulator = 0.0
+        self.last_time = None
+        self.dropped_time = 0.0  # Wall-clock time skipped because of max_substeps
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.last_time = None
+
+    def substeps(self, now):
+        """
+        Adds the time since the previous call and returns how many physics steps to run now.
+        Args:
+            now: Current wall-clock time in seconds (float).
+        Returns: Number of physics steps (int). The first call runs one step.
+        """
+        if self.last_time is None:
+            self.last_time = now - self.physics_dt
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        steps = int(self.accumulator / self.physics_dt + 1e-9)  # Tolerate rounding just below a whole step
+        if steps > self.max_substeps:
+            self.dropped_time += (steps - self.max_substeps) * self.physics_dt
+            steps = self.max_substeps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.physics_dt
+        return steps
+
+    @property
+    def alpha(self):
+        """Fraction of a physics step accumulated but not simulated yet, in [0, 1)"""
+        return min(max(self.accumulator / self.physics_dt, 0.0), 1.0)
+
+    def interpolate(self, previous, current):
+        """
+        Blends two get_states() snapshots one physics step apart by alpha, for a smooth broadcast between
+        physics steps. The result is the state alpha of a step after `previous`, i.e. (1 - alpha) of a step behind
+        wall-clock time. Ships that are new or done are sent as in `current`.
+        Returns: Dict of {ship_id: state dict} with the same keys as `current`.
+        """
+        alpha = self.alpha
+        if alpha == 0.0 or not previous:
+            return current
+        blended = {}
+        for ship_id, state in current.items():
+            before = previous.get(ship_id)
+            if before is None or state['done']:
+                blended[ship_id] = state
+                continue
+            state = dict(state)
+            for name in INTERPOLATED_FIELDS:
+                if state.get(name) is not None and before.get(name) is not None:  # Non-finite elements are None
+                    state[name] = before[name] + alpha * (state[name] - before[name])
+            blended[ship_id] = state
+        return blended
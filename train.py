@@ -1,75 +1,152 @@
 import os
 import datetime
+from collections import deque
 import numpy as np
 from stable_baselines3 import PPO
 from stable_baselines3.common.callbacks import BaseCallback
 from model import create_model
+from recording import VecEpisodeRecorder, EpisodeWriter
+from episode_store import EpisodeStore
+from vec_env import ParallelOrbitalEnv
 
 # SaveBest is a custom callback that saves the best model during training based on average episode reward.
+# It follows every env of the (vectorized) training env: each finished episode's total reward enters a rolling
+# window, and whenever the window's mean beats the best so far the model is saved as best_model.zip.
+# Steps of all envs are recorded together with a VecEpisodeRecorder: 'full' saves every episode's steps,
+# 'summary' only keeps one summary dict per episode in episode_summaries, 'off' records nothing.
+# Episodes are appended to an EpisodeStore in the 'training/episodes' folder by an EpisodeWriter thread, so that
+# rollouts do not wait on the disk; pending episodes are written when training ends,
+# and the next learn() call starts a new writer.
 class SaveBest(BaseCallback):
-    def __init__(self, save_path, verbose=0):
+    EPISODE_FIELDS = ('x', 'y', 'vx', 'vy', 'episode_step', 'action', 'reward', 'r_err_norm', 'd_r_err_norm',
+                      'int_r_err_norm')
+
+    def __init__(self, save_path, verbose=0, record='full', max_pending=16, when_full='block', window=20):
+        """
+        Args:
+            save_path: Model directory; episodes are saved in its 'training' folder and the best model in it (str).
+            verbose: Verbosity level (int).
+            record: Recording level, 'off', 'summary' or 'full' (see recording.py) (str).
+            max_pending: Episodes waiting for the writer thread before when_full applies (int).
+            when_full: 'block' training until the writer catches up, or 'drop' the episode (str).
+            window: Finished episodes in the rolling mean reward; the best model is only checked once the window
+                    is full (int).
+        """
         super(SaveBest, self).__init__(verbose)
+        self.best_model_path = os.path.join(save_path, 'best_model')
         self.save_path = os.path.join(save_path, 'training')  # Create a "training" folder
         os.makedirs(self.save_path, exist_ok=True)  # Ensure the folder exists
-        self.episode_data = []
+        self.record = record
+        self.recorder = None  # VecEpisodeRecorder, created once the number of envs is known
+        self.episode_summaries = []
+        self.store = EpisodeStore(os.path.join(self.save_path, 'episodes'), self.EPISODE_FIELDS)
+        self.max_pending = max_pending
+        self.when_full = when_full
+        self.writer = EpisodeWriter(self.store.append, max_pending=max_pending, policy=when_full)
+        self.episode_rewards = None  # Reward of each env's current episode so far
+        self.step_values = None
+        self.recent_rewards = deque(maxlen=window)  # Total rewards of the last finished episodes
+        self.mean_reward = None
         self.best_mean_reward = -float('inf')
         self.episode_num = 0  # Track episode number for saving
-        self.episode_step = 0  # Track number of steps in the current episode
+
+    def _init_callback(self):
+        num_envs = self.training_env.num_envs
+        self.recorder = VecEpisodeRecorder(num_envs, self.EPISODE_FIELDS, level=self.record)
+        self.episode_rewards = np.zeros(num_envs)
+        self.step_values = np.zeros((num_envs, len(self.EPISODE_FIELDS)))  # The step's row of every env
 
     def _on_step(self) -> bool:
         """
-        This method is called at each step in the environment.
+        This method is called at each step in the environment, with the step of every env.
         """
-        info = self.locals["infos"][0]
-        state = info["state"]
-        action = np.squeeze(self.locals["actions"])
-        r_err_norm = info["r_err_norm"]
-        d_r_err_norm = info["d_r_err_norm"]
-        int_r_err_norm = info["int_r_err_norm"]
-
-        # Append data with new quantities
-        self.episode_data.append((
-            *state, self.episode_step, action, r_err_norm, d_r_err_norm, int_r_err_norm
-        ))
-
-        self.episode_step += 1
-
-        # Check if the episode has finished
-        done = self.locals["dones"][0]
-        if done:
-            self.save_episode_data(self.episode_data, self.episode_num)
+        infos = self.locals["infos"]
+        rewards = np.asarray(self.locals["rewards"], dtype=np.float64)
+        actions = np.asarray(self.locals["actions"], dtype=np.float64).reshape(len(infos), -1)[:, 0]
+        self.episode_rewards += rewards
+
+        # Record the step's quantities, one column per field. VecOrbitalEnv and ParallelOrbitalEnv hold the
+        # states and errors as arrays; other envs only have them in the infos
+        if self.recorder.level != 'off':
+            values = self.step_values
+            states = getattr(self.training_env, 'step_states', None)
+            if states is not None:
+                values[:, :4] = states
+                values[:, 7:] = self.training_env.step_errors
+            else:
+                for i, info in enumerate(infos):
+                    values[i, :4] = info["state"]
+                    values[i, 7:] = info["r_err_norm"], info["d_r_err_norm"], info["int_r_err_norm"]
+            values[:, 4] = self.recorder.steps
+            values[:, 5] = actions
+            values[:, 6] = rewards
+            self.recorder.record(values.T)
+
+        # Save the episodes that have finished and start new ones
+        finished = np.flatnonzero(self.locals["dones"])
+        for env in finished:
+            if self.recorder.level == 'full':
+                self.save_episode_data(self.recorder.columns(env), self.episode_num)
+            elif self.recorder.level == 'summary':
+                self.episode_summaries.append(self.recorder.summary(env))
+            self.recent_rewards.append(self.episode_rewards[env])
             self.episode_num += 1
-            self.episode_data = []
-            self.episode_step = 0
+        if len(finished):
+            self.recorder.reset(finished)
+            self.episode_rewards[finished] = 0.0
+            self._check_best()
 
         return True
 
+    def _check_best(self):
+        """Saves the model if the rolling mean episode reward is the best so far"""
+        self.mean_reward = float(np.mean(self.recent_rewards))
+        self.logger.record("rollout/rolling_mean_reward", self.mean_reward)
+        if len(self.recent_rewards) < self.recent_rewards.maxlen or self.mean_reward <= self.best_mean_reward:
+            return
+        self.best_mean_reward = self.mean_reward
+        self.model.save(self.best_model_path)
+        if self.verbose:
+            print(f"New best mean reward {self.mean_reward:.2f} over {len(self.recent_rewards)} episodes, "
+                  f"saved to {self.best_model_path}.zip")
+
+    def _on_training_start(self):
+        # The writer of a previous learn() call was closed when it ended
+        if self.writer.closed:
+            self.writer = EpisodeWriter(self.store.append, max_pending=self.max_pending, policy=self.when_full)
+
+    def _on_training_end(self):
+        self.writer.close()
+        if self.writer.dropped and self.verbose:
+            print(f"SaveBest dropped {self.writer.dropped} episodes while the writer was behind.")
+
     def save_episode_data(self, episode_data, episode_num):
         """
-        Saves the current episode data to a file.
+        Queues the current episode data to be appended to the store by the writer thread.
+        Args:
+            episode_data: Dict of {field: array [steps]}, e.g. VecEpisodeRecorder.columns(env). Copied here.
+            episode_num: Number of the episode in the store (int).
         """
-        # Save the current episode data to a .npz file, ensuring each array is properly dimensioned
-        np.savez(os.path.join(self.save_path, f'episode_{episode_num}.npz'),
-                x=np.array([step[0] for step in episode_data]),
-                y=np.array([step[1] for step in episode_data]),
-                vx=np.array([step[2] for step in episode_data]),
-                vy=np.array([step[3] for step in episode_data]),
-                episode_step=np.array([step[4] for step in episode_data]),
-                action=np.array([step[5] for step in episode_data]),
-                r_err_norm=np.array([step[6] for step in episode_data]),
-                d_r_err_norm=np.array([step[7] for step in episode_data]),
-                int_r_err_norm=np.array([step[8] for step in episode_data]))
+        columns = {name: np.array(values) for name, values in episode_data.items()}
+        self.writer.submit(columns, episode_num)
 
 """
     Train the model in "env" environment for X number of timesteps with Y reward threshold to stop training
     Save into particular directory
 """
-def train_model(env, save_dir, total_timesteps=10_000):
+def train_model(env, save_dir, total_timesteps=10_000, n_workers=None, envs_per_worker=8, reward='hohmann',
+                optimizer='adam'):
     """
     Args:
-        env: Training environment (gym.Env).
+        env: Training environment (gym.Env, or a VecEnv such as VecOrbitalEnv; SaveBest records all its envs).
+             If None, a ParallelOrbitalEnv of n_workers processes with envs_per_worker episodes each is created
+             for the run and closed afterwards (call from under `if __name__ == "__main__":`).
         save_dir: Directory to save the model and training data (str).
         total_timesteps: Number of timesteps to train (int).
+        n_workers: Worker processes when env is None; defaults to the number of CPU cores (int or None).
+        envs_per_worker: Episodes stepped together in each worker when env is None (int).
+        reward: Name of the training reward in rewards.py for the ParallelOrbitalEnv created when env is None (str).
+        optimizer: Policy optimizer, 'adam' or 'newton' (see model.create_model) (str).
 
     Returns:
         Tuple of (trained model, model save path).
@@ -79,11 +156,28 @@ def train_model(env, save_dir, total_timesteps=10_000):
     model_save_path = os.path.join(save_dir, model_name)
     os.makedirs(model_save_path, exist_ok=True)
 
+    owns_env = env is None
+    if owns_env:
+        env = ParallelOrbitalEnv(n_workers=n_workers, envs_per_worker=envs_per_worker, reward=reward)
+
     callback = SaveBest(save_path=model_save_path)
-    model = create_model(env)
+    model = create_model(env, optimizer=optimizer)
     
     # Train the model and save weights
-    model.learn(total_timesteps=total_timesteps, callback=callback)
+    try:
+        model.learn(total_timesteps=total_timesteps, callback=callback)
+    except BaseException:
+        # Write what is pending, but let the training error propagate rather than a writer error
+        try:
+            callback.writer.close()
+        except Exception as error:
+            print(f"Episode writer failed while closing after a training error: {error!r}")
+        raise
+    else:
+        callback.writer.close()
+    finally:
+        if owns_env:
+            env.close()
     model.save(os.path.join(model_save_path, "ppo_orbital_model"))
 
     print(f"Training completed. Model and data saved in {model_save_path}")
@@ -0,0 +1,445 @@
+"""
+Vectorized version of OrbitalEnvWrapper implementing the Stable-Baselines3 VecEnv interface directly.
+
+All N episodes live in NumPy arrays and every step is one batched RK4 call (physics.py), one batched swept
+boundary check (collision.py) and the Hohmann reward and observation computed over all envs at once, so rollout
+collection is dominated by the policy forward pass instead of N Python env objects.
+ParallelOrbitalEnv spreads VecOrbitalEnv batches over worker processes that exchange observations, actions,
+rewards and info values through shared-memory arrays; only short commands go through pipes.
+Finished episodes are reset automatically, as SB3 expects: their last observation is in
+info['terminal_observation'] and the returned observation is the first one of the next episode.
+"""
+import multiprocessing
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+try:
+    from gymnasium import spaces  # Stable-Baselines3 >= 2.0 expects Gymnasium spaces
+except ImportError:
+    from gym import spaces
+
+import collision
+import kepler
+import physics
+from reference import HohmannReference
+from rewards import get_reward
+
+
+def make_infos(states, errors, dones, truncated, terminal):
+    """Info dicts as OrbitalEnvWrapper returns them (what SaveBest reads), plus SB3's auto-reset entries"""
+    infos = [{
+        "state": tuple(state),
+        "r_err_norm": r_err_norm,
+        "d_r_err_norm": d_r_err_norm,
+        "int_r_err_norm": int_r_err_norm,
+    } for state, (r_err_norm, d_r_err_norm, int_r_err_norm) in zip(states.tolist(), errors.tolist())]
+    for i in np.flatnonzero(dones):
+        infos[i]["terminal_observation"] = terminal[i]
+        infos[i]["TimeLimit.truncated"] = bool(truncated[i])
+    return infos
+
+
+# VecOrbitalEnv runs num_envs OrbitalEnvWrapper episodes side by side, with the same dynamics (RK4, tangential
+# thrust, swept boundary check), the same Hohmann tracking errors and rewards and the same 7-value observation.
+class VecOrbitalEnv(VecEnv):
+    def __init__(self, num_envs=8, r0=None, GM=1.0, dt=0.01, max_steps=5000, r_final=1.0, backend=None, seed=None,
+                 reward='hohmann', action_repeat=1):
+        """
+        Args:
+            num_envs: Number of episodes run side by side (int).
+            r0: Initial orbital radius of every episode (float). If None, each episode draws one in [0.2, 4.0].
+            GM: Gravitational constant (float).
+            dt: Time step for the simulation (float).
+            max_steps: Maximum number of simulation steps per episode (int).
+            r_final: Target radius of the Hohmann transfer (float).
+            backend: Physics kernel backend (see physics.py). Defaults to the fastest one for arrays (str or None).
+            seed: Seed of the random generator used for initial radii (int or None).
+            reward: Name of the reward in rewards.py (str).
+            action_repeat: Physics steps per VecEnv step with the actions held, as in OrbitalEnvWrapper (int).
+        """
+        if int(action_repeat) < 1:
+            raise ValueError(f"Action repeat '{action_repeat}' must be at least 1.")
+        self.r0 = r0
+        self.GM = GM
+        self.dt = dt
+        self.max_steps = max_steps
+        self.r_final = r_final
+        self.kernel = physics.get_kernel(backend or physics.default_backend(batched=True))
+        self.rng = np.random.default_rng(seed)
+        self.render_mode = None
+        self.reference = HohmannReference(GM=GM, r_final=r_final, dt=dt)
+        self.reward = get_reward(reward)
+        self.action_repeat = int(action_repeat)
+        # Widest reference table any episode can need: transfer time grows with init_r
+        self.table_width = self.reference.table_length(r0 if r0 is not None else 4.0)
+
+        # Per-episode state, one row per env
+        self.state = np.zeros((num_envs, 4))
+        self.init_r = np.ones(num_envs)
+        self.current_step = np.zeros(num_envs, dtype=np.int64)
+        self.prev_r_err = np.zeros(num_envs)
+        self.has_prev = np.zeros(num_envs, dtype=bool)
+        self.integral_r_err = np.zeros(num_envs)
+        self.r_table = np.full((num_envs, self.table_width), float(r_final))  # r_expected per step
+        self.transfer_time = np.ones(num_envs)
+        self.actions = None
+        # End of the last step of every env before auto-reset, as in the infos but as arrays (e.g. for SaveBest)
+        self.step_states = np.zeros((num_envs, 4))  # x, y, vx, vy
+        self.step_errors = np.zeros((num_envs, 3))  # r_err_norm, d_r_err_norm, int_r_err_norm
+
+        action_space = spaces.Box(low=-1.0, high=1.0, shape=(1,), dtype=np.float32)
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32)
+        super().__init__(num_envs, observation_space, action_space)
+
+    ######################## VECENV INTERFACE ########################
+    def reset(self):
+        """
+        Resets every episode.
+        Returns: Observations [num_envs, 7].
+        """
+        self._reset_envs(np.arange(self.num_envs))
+        return self._convert_state(self.state)
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)
+
+    def step_wait(self):
+        """
+        Advances every episode by action_repeat timesteps.
+        Returns: Tuple of (observations [num_envs, 7], rewards [num_envs], dones [num_envs], infos (list of dicts)).
+        """
+        observations, rewards, dones, truncated, terminal, states, errors = self._step(self.actions[:, 0])
+        self.step_states, self.step_errors = states, errors
+        return observations, rewards, dones, make_infos(states, errors, dones, truncated, terminal)
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        """Re-seeds the random generator used for initial radii, from the next reset on"""
+        self.rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def get_attr(self, attr_name, indices=None):
+        """Per-env values of array attributes (e.g. 'init_r'), the shared value of any other attribute"""
+        value = getattr(self, attr_name)
+        indices = list(self._get_indices(indices))
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[i] for i in indices]
+        return [value] * len(indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        current = getattr(self, attr_name, None)
+        if isinstance(current, np.ndarray) and current.shape[:1] == (self.num_envs,):
+            current[list(self._get_indices(indices))] = value
+        else:
+            setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Calls the method once for the whole batch; every requested index gets its result"""
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * len(list(self._get_indices(indices)))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(list(self._get_indices(indices)))
+
+    ######################## BATCHED EPISODE LOGIC ########################
+    def _step(self, thrust):
+        """
+        Steps every episode action_repeat times with tangential thrust [num_envs], summing the rewards, and
+        resets the finished ones. An episode that ends on a substep is not stepped further.
+        Returns: Tuple of (observations [N, 7], rewards [N], dones [N], truncated [N], terminal observations
+                 [N, 7] (valid where done), end-of-step states [N, 4], errors [N, 3] (r, d_r and int_r_err_norm)).
+        """
+        n = self.num_envs
+        rewards = np.zeros(n)
+        dones = np.zeros(n, dtype=bool)
+        truncated = np.zeros(n, dtype=bool)
+        errors = np.zeros((n, 3))
+        rows = np.arange(n)
+        for _ in range(self.action_repeat):
+            step_rewards, lost, step_truncated, step_errors = self._substep(rows, thrust[rows])
+            rewards[rows] += step_rewards
+            errors[rows] = step_errors
+            truncated[rows] = step_truncated
+            dones[rows] = lost | step_truncated
+            rows = rows[~dones[rows]]
+            if len(rows) == 0:
+                break
+
+        observations = self._convert_state(self.state)
+        terminal = observations.copy()
+        states = self.state.copy()
+
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            self._reset_envs(finished)
+            observations[finished] = self._convert_state(self.state[finished], finished)
+        return observations, rewards.astype(np.float32), dones, truncated, terminal, states, errors
+
+    def _substep(self, rows, thrust):
+        """
+        One physics step of the episodes in rows with tangential thrust [len(rows)].
+        Returns: Tuple of (rewards, lost, truncated, errors [len(rows), 3]).
+        """
+        start = self.state[rows]
+        end, out = self.kernel.step(start, thrust, self.GM, self.dt)
+
+        # Ships whose path left the annulus during the step stop where it happened
+        s, _ = collision.boundary_crossings(start, end, self.dt, physics.R_MIN, physics.R_MAX)
+        crossed = np.flatnonzero(~np.isnan(s))
+        if len(crossed):
+            end[crossed] = collision.hermite_state(start[crossed], end[crossed], self.dt, s[crossed])
+        self.state[rows] = end
+
+        lost = out | ~np.isnan(s)
+        truncated = (self.current_step[rows] >= self.max_steps) & ~lost
+        self.current_step[rows] += 1
+
+        rewards, r_err_norm, d_r_err_norm, int_r_err_norm = self._tracking_reward(rows, end, thrust)
+        return rewards, lost, truncated, np.stack([r_err_norm, d_r_err_norm, int_r_err_norm], axis=1)
+
+    def _reset_envs(self, idx):
+        """Starts new episodes in rows idx on circular orbits"""
+        n = len(idx)
+        r = np.full(n, float(self.r0)) if self.r0 is not None else self.rng.uniform(0.2, 4.0, n)
+        self.init_r[idx] = r
+        self.state[idx] = np.stack([r, np.zeros(n), np.zeros(n), np.sqrt(self.GM / r)], axis=1)
+        self.current_step[idx] = 0
+        self.prev_r_err[idx] = 0.0
+        self.has_prev[idx] = False
+        self.integral_r_err[idx] = 0.0
+        self.r_table[idx] = self.reference.tables(r, self.table_width)
+        self.transfer_time[idx] = self.reference.transfer(r)['transfer_time']
+
+    def _tracking_reward(self, rows, state, thrust):
+        """
+        Hohmann tracking errors as OrbitalEnvWrapper computes them and the configured reward, for the envs in rows.
+        Returns: Tuple of (rewards, r_err_norm, d_r_err_norm, int_r_err_norm), arrays [len(rows)].
+        """
+        x, y = state[:, 0], state[:, 1]
+        r = np.sqrt(x**2 + y**2)
+        step = self.current_step[rows]
+        t = step * self.dt
+
+        # Expected radius (Target) from each episode's precomputed Hohmann table
+        r_initial = self.init_r[rows]
+        r_final = self.r_final
+        transfer_time = self.transfer_time[rows]
+        r_expected = self.r_table[rows, np.minimum(step, self.table_width - 1)]
+
+        # Compute errors
+        r_err = r - r_expected
+        d_r_err = np.where(self.has_prev[rows], (r_err - self.prev_r_err[rows]) / self.dt, 0.0)
+        self.prev_r_err[rows] = r_err
+        self.has_prev[rows] = True
+        self.integral_r_err[rows] += r_err * self.dt
+        integral_r_err = self.integral_r_err[rows]
+        max_timesteps_passed = self.max_steps * self.dt
+
+        # Normalize errors
+        r_err_norm = r_err / r_expected
+        d_r_err_norm = d_r_err / (r_expected / transfer_time)
+        int_r_err_norm = integral_r_err / (r_expected * max_timesteps_passed)
+
+        reward = self.reward({
+            'x': x, 'y': y, 'vx': state[:, 2], 'vy': state[:, 3],
+            'r': r,
+            'action': thrust,
+            'init_r': r_initial,
+            'r_final': r_final,
+            'r_err_norm': r_err_norm,
+            'd_r_err_norm': d_r_err_norm,
+            'int_r_err_norm': int_r_err_norm,
+            'time_factor': t / max_timesteps_passed,
+        })
+        return reward, r_err_norm, d_r_err_norm, int_r_err_norm
+
+    def _convert_state(self, state, idx=None):
+        """OrbitalEnvWrapper's observation [len(state), 7] for the states of rows idx (default: all)"""
+        init_r = self.init_r if idx is None else self.init_r[idx]
+        x, y, vx, vy = state.T
+        el = kepler.elements(x, y, vx, vy, self.GM)
+        r = el['r']
+        flag = (np.abs(r - 1.0) < 0.01).astype(np.float64)
+
+        r_err = r - 1.0
+        r_max_err = np.maximum(np.abs(init_r - 1), 1e-2)
+        scaled_r_err = np.clip((r_err / r_max_err) * 2, -2, 2)
+
+        return np.stack([
+            scaled_r_err,
+            el['v_radial'],
+            el['v_tangential'],
+            1 - init_r,
+            flag,
+            el['energy'],
+            el['angular_momentum'],
+        ], axis=1).astype(np.float32)
+
+
+######################## MULTI-PROCESS ROLLOUTS ########################
+# Shared arrays of ParallelOrbitalEnv: name -> (ctypes code, NumPy dtype, values per env)
+SHARED_BUFFERS = {
+    'actions': ('f', np.float32, 1),
+    'observations': ('f', np.float32, 7),
+    'terminal_observations': ('f', np.float32, 7),
+    'rewards': ('f', np.float32, 1),
+    'dones': ('b', np.bool_, 1),
+    'truncated': ('b', np.bool_, 1),
+    'states': ('d', np.float64, 4),
+    'errors': ('d', np.float64, 3),
+}
+
+
+def _shared_views(buffers, num_envs):
+    """NumPy arrays [num_envs, width] over the shared RawArrays"""
+    views = {}
+    for name, (_, dtype, width) in SHARED_BUFFERS.items():
+        views[name] = np.frombuffer(buffers[name], dtype=dtype).reshape(num_envs, width)
+    return views
+
+
+def _worker(conn, buffers, num_envs, lo, hi, env_kwargs, seed):
+    """Runs a VecOrbitalEnv over rows lo:hi of the shared arrays until told to close"""
+    env = VecOrbitalEnv(num_envs=hi - lo, seed=seed, **env_kwargs)
+    views = {name: view[lo:hi] for name, view in _shared_views(buffers, num_envs).items()}
+    while True:
+        command, argument = conn.recv()
+        if command == 'step':
+            observations, rewards, dones, truncated, terminal, states, errors = env._step(
+                views['actions'][:, 0].astype(np.float64))
+            views['observations'][:] = observations
+            views['rewards'][:, 0] = rewards
+            views['dones'][:, 0] = dones
+            views['truncated'][:, 0] = truncated
+            views['terminal_observations'][dones] = terminal[dones]
+            views['states'][:] = states
+            views['errors'][:] = errors
+            conn.send(None)
+        elif command == 'reset':
+            views['observations'][:] = env.reset()
+            conn.send(None)
+        elif command == 'seed':
+            conn.send(env.seed(argument))
+        elif command == 'get_attr':
+            conn.send(env.get_attr(argument))
+        elif command == 'set_attr':
+            name, value, local = argument
+            conn.send(env.set_attr(name, value, local))
+        elif command == 'env_method':
+            name, args, kwargs = argument
+            conn.send(env.env_method(name, *args, **kwargs))
+        elif command == 'close':
+            conn.send(None)
+            break
+
+
+# ParallelOrbitalEnv is a VecEnv over n_workers processes, each stepping envs_per_worker episodes as one
+# VecOrbitalEnv. Worker k owns rows k * envs_per_worker onwards of every shared array. step_async() only writes
+# the actions and signals the workers, so they step while the caller goes on until step_wait().
+class ParallelOrbitalEnv(VecEnv):
+    def __init__(self, n_workers=None, envs_per_worker=8, seed=None, start_method=None, **env_kwargs):
+        """
+        Args:
+            n_workers: Worker processes; defaults to the number of CPU cores (int or None).
+            envs_per_worker: Episodes stepped together in each worker (int).
+            seed: Base seed; worker k draws initial radii from seed + k (int or None).
+            start_method: multiprocessing start method ('fork', 'spawn', ...), platform default if None (str).
+            env_kwargs: Passed to every worker's VecOrbitalEnv (r0, GM, dt, max_steps, r_final, backend, reward,
+                        action_repeat).
+        """
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+        self.envs_per_worker = envs_per_worker
+        num_envs = self.n_workers * envs_per_worker
+        context = multiprocessing.get_context(start_method)
+
+        self._buffers = {name: context.RawArray(code, num_envs * width)
+                         for name, (code, _, width) in SHARED_BUFFERS.items()}
+        self._views = _shared_views(self._buffers, num_envs)
+        self.step_states = self._views['states']  # VecOrbitalEnv.step_states, filled in place by the workers
+        self.step_errors = self._views['errors']
+        self._pipes, self._processes = [], []
+        for k in range(self.n_workers):
+            lo, hi = k * envs_per_worker, (k + 1) * envs_per_worker
+            parent, child = context.Pipe()
+            worker_seed = None if seed is None else seed + k
+            process = context.Process(target=_worker, args=(child, self._buffers, num_envs, lo, hi, env_kwargs,
+                                                            worker_seed), daemon=True)
+            process.start()
+            child.close()
+            self._pipes.append(parent)
+            self._processes.append(process)
+        self.closed = False
+
+        action_space = spaces.Box(low=-1.0, high=1.0, shape=(1,), dtype=np.float32)
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(7,), dtype=np.float32)
+        super().__init__(num_envs, observation_space, action_space)
+
+    def _broadcast(self, command, argument=None):
+        """Sends a command to every worker and returns their replies"""
+        for pipe in self._pipes:
+            pipe.send((command, argument))
+        return [pipe.recv() for pipe in self._pipes]
+
+    def _request(self, worker, command, argument=None):
+        self._pipes[worker].send((command, argument))
+        return self._pipes[worker].recv()
+
+    def _per_env(self, command, argument, indices):
+        """Per-env replies of a command answered by each worker for all of its envs"""
+        replies = {}
+        values = []
+        for i in self._get_indices(indices):
+            worker = i // self.envs_per_worker
+            if worker not in replies:
+                replies[worker] = self._request(worker, command, argument)
+            values.append(replies[worker][i % self.envs_per_worker])
+        return values
+
+    def reset(self):
+        self._broadcast('reset')
+        return self._views['observations'].copy()
+
+    def step_async(self, actions):
+        self._views['actions'][:] = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, 1)
+        for pipe in self._pipes:
+            pipe.send(('step', None))
+
+    def step_wait(self):
+        for pipe in self._pipes:
+            pipe.recv()
+        views = self._views
+        dones = views['dones'][:, 0].copy()
+        infos = make_infos(views['states'], views['errors'], dones, views['truncated'][:, 0],
+                           views['terminal_observations'].copy())
+        return views['observations'].copy(), views['rewards'][:, 0].copy(), dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        self._broadcast('close')
+        for process in self._processes:
+            process.join()
+        self.closed = True
+
+    def seed(self, seed=None):
+        """Re-seeds worker k with seed + k (or fresh entropy), from the next reset on"""
+        return [s for k in range(self.n_workers)
+                for s in self._request(k, 'seed', None if seed is None else seed + k)]
+
+    def get_attr(self, attr_name, indices=None):
+        return self._per_env('get_attr', attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        local = {}
+        for i in self._get_indices(indices):
+            local.setdefault(i // self.envs_per_worker, []).append(i % self.envs_per_worker)
+        for worker, rows in local.items():
+            self._request(worker, 'set_attr', (attr_name, value, rows))
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._per_env('env_method', (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(list(self._get_indices(indices)))